@@ -29,6 +29,8 @@
 
 import time
 import os
+import socket
+import sys
 from command import *
 #from command import killMajorProcesses
 from options import *
@@ -44,10 +46,22 @@ from project_map import ProjectMap
 #from clean_server import CleanServer
 from repo_set import *
 from dependency_graph import DependencyGraph
-from export import Export, convert_rsync_path
+from build_durations import BuildDurations
+from build_trace import write_trace
+from snapshot import snapshot
+from artifact_store import ArtifactStore, merge_manifests
+from import_cache import ImportCache
+from export import Export, PartialTestExport, convert_rsync_path
 from gtest import *
+from transport import Transport, TransportError, CircuitOpen, TRANSPORT
+from jenkins_client import JenkinsClient, StandInJenkins
+from jenkins_simulator import SimulatedJenkins
+from status_watcher import StatusWatcher
 from jenkins import *
 from bisect_test import *
+from job_planner import JobPlanner
+from results_db import ResultsDB
+from flaky import FlakyTests
 from builders import *
 from timer import TimeOut
 from deqp_builder import *
@@ -114,6 +128,7 @@ def build(builder, options=None, time_limit=None, import_build=True):
         invoke = ProjectInvoke(options)
 
     invoke.set_info("start_time", time.time())
+    invoke.set_info("host", socket.gethostname())
 
     # start a thread to limit the run-time of the build
     to = TimeOut(time_limit)
@@ -148,12 +163,19 @@ def build(builder, options=None, time_limit=None, import_build=True):
                 print("Running a second time to test shader cache!")
                 a()
         except:
+            failure = sys.exc_info()
             # we need to cancel the timer first, in case
             # set_status fails, and the timer is left running
             to.end()
             invoke.set_info("status", "failed")
+            # a failed export must not hide the build failure
+            try:
+                Export().flush_failing_tests()
+            except Exception as e:
+                print("WARN: failed to export failing tests: " + str(e))
             # must cancel timeout timer, which will prevent process from ending
-            raise        
+            raise failure[0], failure[1], failure[2]
+        Export().flush_failing_tests()
                 
     # must cancel timeout timer, which will prevent process from
     # ending.  cancel the timer first, in case set_status fails, and
@@ -0,0 +1,229 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+"""content addressed storage of exported build roots.  Each file is
+stored once on the build master as a blob named by the hash of its
+content and mode.  An exported tree is a directory of manifests which
+reference the blobs, one for each component that was built into the
+tree."""
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from . import run_batch_command
+
+# blobs fetched from or uploaded to the store are kept on each host,
+# so that they are only fetched once.
+BLOB_CACHE = os.path.expanduser("~/.cache/mesa_ci/blobs")
+
+def _file_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), ""):
+            h.update(block)
+    return h.hexdigest()
+
+def _blob_path(blob):
+    return blob[:2] + "/" + blob
+
+def merge_manifests(manifests):
+    """combines the manifests of components which were exported into
+    the same tree.  Where manifests disagree, the most recently uploaded
+    one wins."""
+    merged = {"dirs": [], "links": {}, "files": {}}
+    dirs = set()
+    for manifest in sorted(manifests, key=lambda m: m.get("time", 0)):
+        dirs.update(manifest["dirs"])
+        for (rel, target) in manifest["links"].items():
+            merged["files"].pop(rel, None)
+            merged["links"][rel] = target
+        for (rel, blob) in manifest["files"].items():
+            merged["links"].pop(rel, None)
+            merged["files"][rel] = blob
+    merged["dirs"] = sorted(dirs)
+    return merged
+
+class ArtifactStore:
+    """uploads and materializes trees through the blob store at
+    store, which is an rsync destination"""
+    def __init__(self, store, cache_dir=BLOB_CACHE):
+        self._store = store
+        self._cache = cache_dir
+        if not os.path.exists(self._cache):
+            os.makedirs(self._cache)
+        # hashes of local files, which are recalculated only when the
+        # size or mtime of the file changes.
+        self._hash_file = os.path.join(self._cache, "hashes.json")
+        try:
+            with open(self._hash_file) as fh:
+                self._hashes = json.load(fh)
+        except (IOError, ValueError):
+            self._hashes = {}
+
+    def _hash(self, path, st):
+        entry = self._hashes.get(path)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime:
+            return entry[2]
+        digest = _file_hash(path)
+        self._hashes[path] = [st.st_size, st.st_mtime, digest]
+        return digest
+
+    def _save_hashes(self):
+        tmp = self._hash_file + ".tmp"
+        with open(tmp, "w") as fh:
+            json.dump(self._hashes, fh)
+        os.rename(tmp, self._hash_file)
+
+    def cached(self, blob):
+        return os.path.exists(os.path.join(self._cache, _blob_path(blob)))
+
+    def _add_to_cache(self, path, blob):
+        dest = os.path.join(self._cache, _blob_path(blob))
+        if os.path.exists(dest):
+            return
+        if not os.path.exists(os.path.dirname(dest)):
+            os.makedirs(os.path.dirname(dest))
+        # copy rather than link, as the source tree may be modified in
+        # place by a later build.
+        tmp = dest + ".tmp"
+        shutil.copy2(path, tmp)
+        os.rename(tmp, dest)
+
+    def manifest(self, tree):
+        """describes tree as a dictionary of directories, symlinks and
+        files.  Files are added to the local blob cache."""
+        tree = os.path.abspath(tree)
+        manifest = {"dirs": [], "links": {}, "files": {}}
+        for (dirpath, dirnames, filenames) in os.walk(tree):
+            rel_dir = os.path.relpath(dirpath, tree)
+            if rel_dir != ".":
+                manifest["dirs"].append(rel_dir)
+            for a_file in dirnames + filenames:
+                path = os.path.join(dirpath, a_file)
+                rel = os.path.normpath(os.path.join(rel_dir, a_file))
+                if os.path.islink(path):
+                    manifest["links"][rel] = os.readlink(path)
+                    continue
+                if a_file in dirnames:
+                    continue
+                st = os.lstat(path)
+                mode = "%o" % (st.st_mode & 0o7777)
+                blob = self._hash(path, st) + "-" + mode
+                self._add_to_cache(path, blob)
+                manifest["files"][rel] = blob
+        self._save_hashes()
+        return manifest
+
+    def _rsync_blobs(self, blobs, src, dest):
+        if not blobs:
+            return
+        with tempfile.NamedTemporaryFile(prefix="blobs_", suffix=".list") as fh:
+            fh.write("\n".join([_blob_path(b) for b in blobs]) + "\n")
+            fh.flush()
+            # blobs are immutable, so existing blobs are never resent
+            run_batch_command(["rsync", "-rlpD", "--ignore-existing",
+                               "--files-from=" + fh.name,
+                               src + "/", dest + "/"])
+
+    def upload(self, tree, manifest_dir, component):
+        """sends blobs for tree to the store, and the manifest for tree
+        to manifest_dir.  Components which build into the same tree
+        concurrently each write their own manifest."""
+        manifest = self.manifest(tree)
+        manifest["time"] = time.time()
+        blobs = sorted(set(manifest["files"].values()))
+        self._rsync_blobs(blobs, self._cache, self._store)
+        tmpdir = tempfile.mkdtemp()
+        try:
+            manifest_file = os.path.join(tmpdir, component + ".json")
+            with open(manifest_file, "w") as fh:
+                json.dump(manifest, fh)
+            run_batch_command(["rsync", "-rlpD", tmpdir + "/",
+                               manifest_dir + "/"])
+        finally:
+            shutil.rmtree(tmpdir)
+        print ("INFO: exported {0} files ({1} unique blobs) from {2}"
+               .format(len(manifest["files"]), len(blobs), tree))
+
+    def fetch_manifest(self, manifest_dir):
+        """returns the union of the component manifests in
+        manifest_dir, or None if there are none"""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            try:
+                run_batch_command(["rsync", "-r", manifest_dir + "/",
+                                   tmpdir + "/"], quiet=True)
+            except Exception:
+                return None
+            manifests = []
+            for a_file in glob.glob(tmpdir + "/*.json"):
+                with open(a_file) as fh:
+                    manifests.append(json.load(fh))
+            if not manifests:
+                return None
+            return merge_manifests(manifests)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def materialize(self, manifest, tree):
+        """creates tree from the manifest, fetching any blobs which are
+        not in the local cache.  Files are copied from the cache, as
+        builds and tests may modify installed files in place."""
+        blobs = set(manifest["files"].values())
+        missing = sorted([b for b in blobs if not self.cached(b)])
+        self._rsync_blobs(missing, self._store, self._cache)
+        for a_dir in manifest["dirs"]:
+            path = os.path.join(tree, a_dir)
+            if not os.path.exists(path):
+                os.makedirs(path)
+        for (rel, target) in manifest["links"].items():
+            path = os.path.join(tree, rel)
+            if os.path.lexists(path):
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path)
+                else:
+                    os.unlink(path)
+            os.symlink(target, path)
+        for (rel, blob) in manifest["files"].items():
+            path = os.path.join(tree, rel)
+            cached = os.path.join(self._cache, _blob_path(blob))
+            if os.path.lexists(path):
+                st = os.lstat(path)
+                cached_st = os.stat(cached)
+                # copies keep the mtime of the blob
+                if (not os.path.islink(path) and
+                    st.st_ino != cached_st.st_ino and
+                    (st.st_size, st.st_mtime) ==
+                    (cached_st.st_size, cached_st.st_mtime)):
+                    continue
+                os.unlink(path)
+            shutil.copy2(cached, path)
+        print ("INFO: imported {0} files into {1}, {2} of {3} blobs fetched"
+               .format(len(manifest["files"]), tree, len(missing), len(blobs)))
@@ -78,11 +78,9 @@ class Bisector:
         self.last_failure = None
         self._retest_path=retest_path
         self._bisect_dir = bisect_dir
+        self._skip_known_failures()
 
-    def Bisect(self):
-        if not self.commits:
-            return
-        current_build = len(self.commits) / 2
+    def _repo_project(self):
         repo_project = self.project
         if "piglit" in repo_project:
             repo_project = "piglit"
@@ -90,6 +88,42 @@ class Bisector:
             repo_project = "crucible"
         if "vulkancts" in repo_project:
             repo_project = "vulkancts"
+        return repo_project
+
+    def _skip_known_failures(self):
+        """removes the commits after the first revision at which the
+        results database saw the test fail.  Those builds failed, so
+        the first failure can't be later."""
+        from .results_db import ResultsDB
+        try:
+            db = ResultsDB()
+            revision = db.first_failing_revision(self.test_name,
+                                                 self.hardware, self.arch)
+            db.close()
+        except Exception as e:
+            print "WARN: could not read test history: " + str(e)
+            return
+        if not revision:
+            return
+        prefix = self._repo_project() + "="
+        for a_rev in revision.split():
+            if not a_rev.startswith(prefix):
+                continue
+            sha = a_rev[len(prefix):]
+            for (index, commit) in enumerate(self.commits):
+                if not commit.hexsha.startswith(sha):
+                    continue
+                # commits are ordered newest first
+                print "INFO: test history shows failure at " + a_rev
+                self.last_failure = prefix + commit.hexsha
+                self.commits = self.commits[index + 1:]
+                return
+
+    def Bisect(self):
+        if not self.commits:
+            return self.last_failure
+        current_build = len(self.commits) / 2
+        repo_project = self._repo_project()
         rev = repo_project + "=" + self.commits[current_build].hexsha
         print "Range: " + self.commits[0].hexsha + " - " + self.commits[-1].hexsha + " (" + str(len(self.commits)) + ")"
         print "Building revision: " + rev
@@ -423,12 +457,18 @@ class PiglitTest:
             testname = re.sub('[=:]', ".", testname)
             if self.test_name != testname:
                 continue
+            # the results database records the failure of the first
+            # attempt, which measures the flakiness of the test
+            first_status = "crash"
             etags = testcase.findall("failure")
             for tag in etags:
+                first_status = tag.attrib.get("type", "fail")
                 testcase.remove(tag)
             etags = testcase.findall("error")
             for tag in etags:
+                first_status = "crash"
                 testcase.remove(tag)
+            testcase.attrib["first_status"] = first_status
             stdout = testcase.find("system-out")
             if stdout is None:
                 stdout = et.Element("system-out")
@@ -848,10 +888,42 @@ class DeqpTest:
     def RetestInclude(self):
         return [self.test_name]
     
+def is_test_file(test_path):
+    """true if test_path is a junit file generated by a test project"""
+    for prefix in ["piglit-test", "piglit-vulkancts-test", "piglit-cpu-test",
+                   "piglit-cts", "piglit-glcts", "piglit-crucible",
+                   "piglit-deqp", "piglit-glescts"]:
+        if prefix in test_path:
+            return True
+    return False
+
+def test_class(test_path):
+    """the class which represents tests in the junit file"""
+    testclass = PiglitTest
+    if "crucible" in os.path.basename(test_path):
+        testclass = CrucibleTest
+    if "glescts" in os.path.basename(test_path):
+        testclass = DeqpTest
+    if "glcts" in os.path.basename(test_path):
+        testclass = DeqpTest
+    if "vulkancts" in os.path.basename(test_path):
+        testclass = DeqpTest
+    if "deqp" in os.path.basename(test_path):
+        testclass = DeqpTest
+    return testclass
+
 class TestLister:
     """reads xml files and generates a set of PiglitTest objects"""
-    def __init__(self, bad_dir, include_passes=False):
+    def __init__(self, bad_dir, include_passes=False, count_passes=False,
+                 observer=None):
+        """with count_passes, only failures are listed, but the names
+        of passing tests are recorded for TestCounts().  observer is
+        called with the path and element of every testcase, eg to
+        index the results while they are parsed."""
         self._include_passes = include_passes
+        self._count_passes = count_passes
+        self._observer = observer
+        self._passes = {}
         self._tests = {}
         # each test map is keyed by test name, value is PiglitTest
         self._tests["piglit-test"] = {}
@@ -882,37 +954,33 @@ class TestLister:
             return
         test_files = [bad_dir + "/" + f for f in os.listdir(bad_dir)]
         for a_file in test_files:
-            if ("piglit-test" not in a_file and
-                "piglit-vulkancts-test" not in a_file and
-                "piglit-cpu-test" not in a_file and
-                "piglit-cts" not in a_file and
-                "piglit-glcts" not in a_file and
-                "piglit-crucible" not in a_file and
-                "piglit-deqp" not in a_file and
-                "piglit-glescts" not in a_file):
+            if not is_test_file(a_file):
                 continue
             self._add_tests(a_file)
 
     def _add_tests(self, test_path):
-        t = et.parse(test_path)
-        r = t.getroot()
-
-        testclass = PiglitTest
-        if "crucible" in os.path.basename(test_path):
-            testclass = CrucibleTest
-        if "glescts" in os.path.basename(test_path):
-            testclass = DeqpTest
-        if "glcts" in os.path.basename(test_path):
-            testclass = DeqpTest
-        if "vulkancts" in os.path.basename(test_path):
-            testclass = DeqpTest
-        if "deqp" in os.path.basename(test_path):
-            testclass = DeqpTest
-
-        tags = r.findall(".//failure/..") + r.findall(".//error/..")
-        if self._include_passes:
-            tags = r.findall(".//testcase")
-        for afail in tags:
+        testclass = test_class(test_path)
+
+        # results files can be very large, so testcases are processed
+        # as they are parsed and then discarded.
+        stack = []
+        for (event, afail) in et.iterparse(test_path, events=("start", "end")):
+            if event == "start":
+                stack.append(afail)
+                continue
+            stack.pop()
+            if afail.tag != "testcase":
+                continue
+            # the suite would otherwise keep every parsed testcase
+            if stack:
+                stack[-1].remove(afail)
+            if self._observer:
+                self._observer(test_path, afail)
+            failed = (afail.find("failure") is not None or
+                      afail.find("error") is not None)
+            if not failed and not (self._include_passes or self._count_passes):
+                afail.clear()
+                continue
             test = testclass(full_test_name="unknown", 
                              status="unknown",
                              test_tag=afail,
@@ -920,6 +988,10 @@ class TestLister:
 
             project = test.project
             name = test.test_name
+            if not failed and not self._include_passes:
+                self._passes.setdefault(project, set()).add(name)
+                afail.clear()
+                continue
             if name not in self._tests[project]:
                 self._tests[project][name] = test
                 continue
@@ -939,6 +1011,18 @@ class TestLister:
             tests = tests + project.values()
         return tests
 
+    def TestCounts(self):
+        """dictionary of project to (total, failed) test counts.  A
+        test which fails on any platform is counted as a failure.
+        Requires count_passes."""
+        counts = {}
+        for (project, tests) in self._tests.items():
+            passes = self._passes.get(project, set())
+            total = len(passes.union(tests.keys()))
+            if total:
+                counts[project] = (total, len(tests))
+        return counts
+
     def TestsNotIn(self, other_test_list):
         out_list = []
         for (project, tests) in self._tests.items():
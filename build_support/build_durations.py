@@ -0,0 +1,82 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+"""records how long each component build takes, from trigger to
+collection of its results, so that the longest chains of builds can be
+started first"""
+import os
+import sqlite3
+
+DURATIONS_DB = os.path.expanduser("~/.cache/mesa_ci/durations.db")
+
+# weight of the newest duration in the estimate for a build
+ALPHA = 0.3
+
+SCHEMA = """
+create table if not exists durations (
+    job text primary key,
+    duration real,
+    builds integer);
+"""
+
+class BuildDurations:
+    """estimated duration of each build, by project, options and shard"""
+    def __init__(self, path=None):
+        if path is None:
+            path = DURATIONS_DB
+        if path != ":memory:" and not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        self._db = sqlite3.connect(path)
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    @staticmethod
+    def key(invoke):
+        """identifies builds of the invoke across revisions and result
+        paths"""
+        return invoke.options.type + " " + invoke.to_short_string()
+
+    def record(self, invoke, duration):
+        """updates the estimate for the invoke with a new duration"""
+        key = self.key(invoke)
+        with self._db:
+            row = self._db.execute(
+                "select duration, builds from durations where job = ?",
+                (key,)).fetchone()
+            builds = 1
+            if row:
+                duration = row[0] * (1 - ALPHA) + duration * ALPHA
+                builds = row[1] + 1
+            self._db.execute(
+                "insert or replace into durations values (?, ?, ?)",
+                (key, duration, builds))
+
+    def estimates(self):
+        """dict of key -> estimated duration in seconds"""
+        return dict(self._db.execute("select job, duration from durations"))
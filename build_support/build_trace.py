@@ -0,0 +1,116 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+"""timeline of the builds in a run, in the Chrome trace event format.
+Load the file in chrome://tracing or https://ui.perfetto.dev"""
+import json
+
+# process for builds waiting in the queue for a machine.  Each builder
+# is a process as well, and each build is a thread within the queue and
+# the builder that ran it, so the spans of builds which overlap in time
+# are on separate tracks.
+QUEUE_PID = 1
+
+def trace_events(builds, infos, graph=None):
+    """list of trace events for the builds.  infos maps invoke strings
+    to the status content of each build, and graph maps invoke strings
+    to the invoke strings of their prerequisites."""
+    times = [infos[str(b)].get("trigger_time") for b in builds
+             if str(b) in infos]
+    times = [float(t) for t in times if t]
+    if not times:
+        return []
+    origin = min(times)
+
+    def ts(t):
+        return int((float(t) - origin) * 1000000)
+
+    processes = {"queue" : QUEUE_PID}
+    events = []
+    # invoke string -> (info, builder pid, tid)
+    spans = {}
+    for (tid, build) in enumerate(builds, 1):
+        info = infos.get(str(build), {})
+        host = info.get("host") or "unknown"
+        if host not in processes:
+            processes[host] = len(processes) + QUEUE_PID
+        name = build.to_short_string()
+        args = {"status" : info.get("status", ""),
+                "url" : info.get("url", "")}
+        phases = [("waiting", "trigger_time", "start_time", QUEUE_PID),
+                  ("building", "start_time", "end_time", processes[host]),
+                  ("collecting", "end_time", "collect_time", processes[host])]
+        pids = set()
+        for (phase, start, end, pid) in phases:
+            if not info.get(start) or not info.get(end):
+                continue
+            pids.add(pid)
+            events.append({"name" : name,
+                           "cat" : phase,
+                           "ph" : "X",
+                           "pid" : pid,
+                           "tid" : tid,
+                           "ts" : ts(info[start]),
+                           "dur" : max(ts(info[end]) - ts(info[start]), 0),
+                           "args" : args})
+        for pid in pids:
+            events.append({"name" : "thread_name", "ph" : "M", "pid" : pid,
+                           "tid" : tid, "args" : {"name" : name}})
+        spans[str(build)] = (info, processes[host], tid)
+
+    # arrows from the end of each prerequisite to the trigger of the
+    # builds that waited on it
+    flow_id = 0
+    for (build, (info, _, tid)) in spans.items():
+        if not info.get("trigger_time"):
+            continue
+        for prereq in (graph or {}).get(build, []):
+            if prereq not in spans:
+                continue
+            (prereq_info, prereq_pid, prereq_tid) = spans[prereq]
+            if not prereq_info.get("end_time"):
+                continue
+            flow_id += 1
+            events.append({"name" : "dependency", "cat" : "dependency",
+                           "ph" : "s", "id" : flow_id, "pid" : prereq_pid,
+                           "tid" : prereq_tid,
+                           "ts" : ts(prereq_info["end_time"])})
+            events.append({"name" : "dependency", "cat" : "dependency",
+                           "ph" : "f", "bp" : "e", "id" : flow_id,
+                           "pid" : QUEUE_PID, "tid" : tid,
+                           "ts" : ts(info["trigger_time"])})
+
+    for (host, pid) in processes.items():
+        events.append({"name" : "process_name", "ph" : "M", "pid" : pid,
+                       "args" : {"name" : host}})
+    return events
+
+def write_trace(path, builds, infos, graph=None):
+    """writes the timeline of the builds to path"""
+    with open(path, "w") as outf:
+        json.dump({"traceEvents" : trace_events(builds, infos, graph),
+                   "displayTimeUnit" : "ms"}, outf)
@@ -25,23 +25,27 @@
 #  *   Mark Janes <mark.a.janes@intel.com>
 #  **********************************************************************/
 import multiprocessing
+import multiprocessing.pool
 import os
 import re
 import shutil
 import socket
 import subprocess
 import sys
+import tempfile
 import importlib
 import git
 import glob
+import hashlib
 import time
-import urllib2
 import xml.etree.cElementTree as et
 from . import Options
 from . import ProjectMap
 from . import run_batch_command
 from . import rmtree
+from . import is_exe
 from . import Export
+from . import PartialTestExport
 from . import GTest
 from . import RepoSet
 from . import PiglitTest
@@ -50,7 +54,11 @@ from . import Jenkins
 from . import RevisionSpecification
 from . import get_conf_file
 from . import TestLister
+from . import TRANSPORT
+from . import FlakyTests
 from . import NoConfigFile
+from . import JobPlanner
+from . import snapshot
 
 
 def mesa_version():
@@ -77,11 +85,14 @@ def mesa_version():
         assert len(version_tokens) >= 3
         return version_tokens[2]
 
-def cpu_count():
-    cpus = multiprocessing.cpu_count() + 1
-    if cpus > 18:
-        cpus = 18
-    return cpus
+def cpu_count(arch="m64"):
+    # callers may have their own command line, so don't parse sys.argv
+    return JobPlanner(arch).compile_jobs()
+
+def cmake_job_pools(planner):
+    """limit concurrent links for the cmake ninja generator"""
+    return ["-DCMAKE_JOB_POOLS=link_pool=" + str(planner.link_jobs()),
+            "-DCMAKE_JOB_POOL_LINK=link_pool"]
 
 
 def _system_dirs():
@@ -131,12 +142,336 @@ def delete_src_pyc(path):
                 if os.path.exists(os.path.join(dirpath, each_file)):
                     os.remove(os.path.join(dirpath, each_file))
 
+def _fingerprint_file(repo, name):
+    return os.path.join(repo.git_dir, "mesa_ci_" + name)
+
+def _tree_state(repo):
+    """identifies the commit checked out in the work tree, along with
+    any modified, untracked or ignored files.  Nested checkouts (eg the
+    external repositories of the cts) are listed as single untracked
+    directories, so they do not change the state."""
+    h = hashlib.md5(repo.head.commit.hexsha)
+    h.update(repo.git.status("--porcelain", "--ignored"))
+    h.update(repo.git.diff("HEAD", "--binary"))
+    return h.hexdigest()
+
+def read_fingerprint(repo, name="fingerprint"):
+    try:
+        with open(_fingerprint_file(repo, name), "r") as fh:
+            return fh.read().strip()
+    except IOError:
+        return None
+
+def write_fingerprint(repo, fingerprint, name="fingerprint"):
+    with open(_fingerprint_file(repo, name), "w") as fh:
+        fh.write(fingerprint)
+
 def git_clean(src_dir):
+    """git clean and reset src_dir.  Trees which have not changed since
+    they were last cleaned are left alone."""
+    repo = git.Repo(src_dir)
+    if read_fingerprint(repo, "clean") == _tree_state(repo):
+        print "Already clean: " + src_dir
+        return
     savedir = os.getcwd()
     os.chdir(src_dir)
     run_batch_command(["git", "clean", "-xfd"])
     run_batch_command(["git", "reset", "--hard", "HEAD"])
     os.chdir(savedir)
+    write_fingerprint(repo, _tree_state(repo), "clean")
+
+def prepare_git_tree(repo_path, revision):
+    """cleans repo_path and checks out revision.  Trees which are still
+    in the state that the checkout of the same revision produced are
+    left alone."""
+    repo = git.Repo(repo_path)
+    try:
+        current = (repo.head.commit.hexsha == repo.commit(revision).hexsha)
+    except (ValueError, git.BadName, git.GitCommandError):
+        current = False
+    if current and read_fingerprint(repo) == revision + " " + _tree_state(repo):
+        print "Unchanged: " + repo_path + " : " + revision
+        return False
+
+    print "Cleaning: " + repo_path + " : " + revision
+    repo.git.clean("-xfd")
+    repo.git.reset("--hard", "HEAD")
+    print "Checking out: " + repo_path + " : " + revision
+    repo.git.checkout(revision, force=True)
+    write_fingerprint(repo, revision + " " + _tree_state(repo))
+    return True
+
+# external repositories are prepared concurrently.  The work is
+# dominated by git I/O, so a small pool is sufficient.
+PREPARE_THREADS = 4
+
+def _prepare_package(args):
+    repo_path, revision = args
+    try:
+        prepare_git_tree(repo_path, revision)
+    except Exception as e:
+        return (repo_path, type(e).__name__ + ": " + str(e))
+    return (repo_path, None)
+
+def prepare_git_trees(trees):
+    """runs prepare_git_tree on each (repo_path, revision) tuple in a
+    thread pool.  A failure in one tree does not prevent preparation of
+    the others.  Returns a dictionary of failing repo_path to error."""
+    if not trees:
+        return {}
+    pool = multiprocessing.pool.ThreadPool(min(PREPARE_THREADS, len(trees)))
+    try:
+        results = pool.map(_prepare_package, trees)
+    finally:
+        pool.close()
+        pool.join()
+    failures = {}
+    for (repo_path, error) in results:
+        if error:
+            print "WARN: failed to prepare " + repo_path + ": " + error
+            failures[repo_path] = error
+    return failures
+
+def _patch_files(patch):
+    """list of files modified by a patch"""
+    files = set()
+    with open(patch, "r") as fh:
+        for line in fh:
+            if line.startswith("diff --git "):
+                files.update([f[2:] for f in line.split()[2:4]])
+    return files
+
+def _patch_prerequisites(patch):
+    """patch ids of the prerequisites declared by a patch, as written by
+    'git format-patch --base'"""
+    prerequisites = set()
+    with open(patch, "r") as fh:
+        for line in fh:
+            if line.startswith("prerequisite-patch-id: "):
+                prerequisites.add(line.split()[1])
+    return prerequisites
+
+def _patch_id(repo, patch):
+    with open(patch, "r") as fh:
+        patch_id = repo.git.patch_id("--stable", istream=fh)
+    if not patch_id:
+        return None
+    return patch_id.split()[0]
+
+def order_patches(repo, patches):
+    """sorts patches so that each follows the patches it declares as
+    prerequisites.  Patches are otherwise kept in the given order."""
+    ids = {}
+    for patch in patches:
+        patch_id = _patch_id(repo, patch)
+        if patch_id:
+            ids[patch_id] = patch
+    ordered = []
+    visiting = set()
+    def visit(patch):
+        if patch in ordered or patch in visiting:
+            return
+        visiting.add(patch)
+        for prerequisite in sorted(_patch_prerequisites(patch)):
+            if prerequisite in ids:
+                visit(ids[prerequisite])
+        visiting.remove(patch)
+        ordered.append(patch)
+    for patch in patches:
+        visit(patch)
+    return ordered
+
+def apply_patches(src_dir, patches):
+    """git am each patch, after its prerequisites.  When a patch fails
+    to apply, later patches which declare it as a prerequisite, or which
+    touch any of the same files, are skipped.  Returns the list of
+    patches which were not applied."""
+    repo = git.Repo(src_dir)
+    patches = order_patches(repo, patches)
+    failed_ids = set()
+    blocked = set()
+    not_applied = []
+    for patch in patches:
+        files = _patch_files(patch)
+        if files & blocked or _patch_prerequisites(patch) & failed_ids:
+            print "WARN: skipping patch dependent on failed patch: " + patch
+            blocked.update(files)
+            failed_ids.add(_patch_id(repo, patch))
+            not_applied.append(patch)
+            continue
+        try:
+            repo.git.am(patch)
+        except git.GitCommandError:
+            print "WARN: failed to apply patch: " + patch
+            repo.git.am("--abort")
+            blocked.update(files)
+            failed_ids.add(_patch_id(repo, patch))
+            not_applied.append(patch)
+    return not_applied
+
+def sync_tree(src_dir, dest_dir):
+    """makes dest_dir a copy of the git checkout at src_dir, transferring
+    only files which have changed since the last sync.  The copy
+    includes the .git directory, so revisions can be checked out in
+    dest_dir."""
+    src_repo = git.Repo(src_dir)
+    fingerprint = src_repo.head.commit.hexsha
+    # kept in .git, so the stamp does not appear as an untracked file
+    stamp = os.path.join(dest_dir, ".git", "mesa_ci_sync")
+    if (os.path.exists(stamp) and open(stamp).read().strip() == fingerprint
+        and not src_repo.is_dirty(untracked_files=True)):
+        print "Unchanged: " + dest_dir
+        return
+    if not os.path.exists(dest_dir):
+        os.makedirs(dest_dir)
+    run_batch_command(["rsync", "-a", "--delete",
+                       "--exclude=/.git/mesa_ci_sync",
+                       src_dir + "/", dest_dir + "/"])
+    with open(stamp, "w") as fh:
+        fh.write(fingerprint)
+
+# compiler cache shared by all builds of an arch on a host.  The cache
+# lives outside of the source and build directories, so clean actions
+# do not discard it.
+CCACHE_ROOT = os.path.expanduser("~/.ccache")
+CCACHE_MAXSIZE = "16G"
+
+def parse_ccache_stats(text):
+    """returns a dictionary of ccache counters from the output of
+    'ccache --print-stats', or from the 'ccache -s' summary of ccache
+    3.x releases that predate --print-stats"""
+    counters = {}
+    for line in text.splitlines():
+        m = re.match(r"([a-z_]+)\t([0-9]+)$", line)
+        if m:
+            counters[m.group(1)] = int(m.group(2))
+            continue
+        m = re.match(r"cache hit \((direct|preprocessed)\)\s+([0-9]+)", line)
+        if m:
+            counters[m.group(1) + "_cache_hit"] = int(m.group(2))
+            continue
+        m = re.match(r"cache miss\s+([0-9]+)", line)
+        if m:
+            counters["cache_miss"] = int(m.group(1))
+    return counters
+
+def parse_ccache_stats_log(text):
+    """returns a dictionary of ccache counters from a CCACHE_STATSLOG,
+    which holds a comment line naming each compiled file followed by
+    the counters that compilation incremented"""
+    counters = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        counters[line] = counters.get(line, 0) + 1
+    return counters
+
+class Ccache(object):
+    """configures the shared compiler cache for a build, and records the
+    hit rate of the build in the build info.
+
+    Builds on the same host share the cache directory, so the cache's
+    own counters include other builds.  ccache 4.x logs the result of
+    each of this build's compilations to a private CCACHE_STATSLOG.
+    Older releases fall back to the difference between the counters
+    at start() and at record_stats().  finish() removes the log, and
+    must be called whether or not the build succeeds."""
+    def __init__(self, options=None, project=None):
+        self._options = options
+        if not options:
+            self._options = Options()
+        self._project = project
+        if not project:
+            self._project = ProjectMap().current_project()
+        self._dir = os.path.join(CCACHE_ROOT, self._options.arch)
+        self._enabled = is_exe("ccache") is not None
+        self._start = {}
+        self._log = None
+        if self._enabled and self._version() >= 4:
+            (fd, self._log) = tempfile.mkstemp(prefix="ccache_stats_",
+                                               suffix=".log")
+            os.close(fd)
+
+    def update_env(self, env):
+        env["CCACHE_DIR"] = self._dir
+        env["CCACHE_MAXSIZE"] = CCACHE_MAXSIZE
+        env["CCACHE_COMPRESS"] = "1"
+        # rewrite absolute paths, so builds in different workspaces
+        # can share results
+        env["CCACHE_BASEDIR"] = ProjectMap().source_root()
+        if self._log:
+            env["CCACHE_STATSLOG"] = self._log
+        return env
+
+    def _run(self, args, warn=True):
+        if not self._enabled:
+            return ""
+        if not os.path.exists(self._dir):
+            os.makedirs(self._dir)
+        try:
+            (out, _) = run_batch_command(["ccache"] + args,
+                                         env=self.update_env({}),
+                                         streamedOutput=False, quiet=True)
+        except subprocess.CalledProcessError:
+            if warn:
+                print "WARN: ccache " + " ".join(args) + " failed"
+            return ""
+        return out
+
+    def _version(self):
+        m = re.search(r"version ([0-9]+)", self._run(["--version"]))
+        if not m:
+            return 0
+        return int(m.group(1))
+
+    def _counters(self):
+        out = self._run(["--print-stats"], warn=False)
+        if not out:
+            out = self._run(["-s"])
+        return parse_ccache_stats(out)
+
+    def start(self):
+        """marks the beginning of the build's compilation"""
+        if not self._enabled or self._log:
+            return
+        self._start = self._counters()
+
+    def stats(self):
+        """returns a dictionary of hits and misses since start()"""
+        if self._log:
+            with open(self._log) as fh:
+                counters = parse_ccache_stats_log(fh.read())
+        else:
+            end = self._counters()
+            counters = dict([(k, v - self._start.get(k, 0))
+                             for (k, v) in end.items()])
+        hits = (counters.get("direct_cache_hit", 0) +
+                counters.get("preprocessed_cache_hit", 0))
+        misses = counters.get("cache_miss", 0)
+        rate = 0.0
+        if hits + misses:
+            rate = hits * 100.0 / (hits + misses)
+        return {"hits": hits, "misses": misses, "hit_rate": round(rate, 2)}
+
+    def finish(self):
+        """removes the stats log"""
+        if self._log:
+            os.remove(self._log)
+            self._log = None
+
+    def record_stats(self):
+        if not self._enabled:
+            return
+        stats = self.stats()
+        self.finish()
+        print ("INFO: ccache {0}: {1} hits, {2} misses ({3}%)".format(
+            self._options.arch, stats["hits"], stats["misses"],
+            stats["hit_rate"]))
+        if not self._options.result_path:
+            return
+        ProjectInvoke(self._options,
+                      project=self._project).set_info("ccache", stats)
 
 def check_gpu_hang(identify_test=True):
     # some systems have a gpu hang watchdog which reboots
@@ -180,8 +515,9 @@ def check_gpu_hang(identify_test=True):
             hang_text += "\nHanging Test:\n" + test
         
     hostname = socket.gethostname()
+    # the host is about to reboot, so the failure is exported now
     Export().create_failing_test("gpu-hang-" + hostname,
-                                 hang_text)
+                                 hang_text, flush=True)
     test_path = os.path.abspath(br + "/../test/")
     if not os.path.exists(test_path):
         os.makedirs(test_path)
@@ -196,7 +532,7 @@ def check_gpu_hang(identify_test=True):
         server = ProjectMap().build_spec().find("build_master").attrib["host"]
         url = "http://" + server + "/job/reboot_single/buildWithParameters?token=noauth&label=" + label
         print "opening: " + url
-        urllib2.urlopen(url)
+        TRANSPORT.request(url, idempotent=False)
         print "sleeping to allow reboot job to be scheduled."
         time.sleep(120)
     return True
@@ -256,25 +592,34 @@ class AutoBuilder(object):
         run_batch_command(["autoreconf", "--verbose", "--install", "-s"], env=self._env)
         os.chdir(self._build_dir)
 
-        env = self._env.copy()
-        env.update({
-            "PKG_CONFIG_PATH": pkg_config,
-            "LD_LIBRARY_PATH": get_libdir(),
-            "CC": "ccache gcc -" + self._options.arch,
-            "CXX": "ccache g++ -" + self._options.arch,
-        })
-
-        run_batch_command([self._src_dir + "/configure", 
-                           "--prefix=" + self._build_root] + \
-                          flags + self._configure_options, env=env)
-
-        run_batch_command(["make",  "-j", 
-                           str(cpu_count())], env=self._env)
-        if self.install:
-            run_batch_command(["make",  '-j', str(cpu_count()), "install"],
-                              env=self._env)
+        ccache = Ccache(self._options, self._project)
+        try:
+            ccache.update_env(self._env)
+            ccache.start()
+            env = self._env.copy()
+            env.update({
+                "PKG_CONFIG_PATH": pkg_config,
+                "LD_LIBRARY_PATH": get_libdir(),
+                "CC": "ccache gcc -" + self._options.arch,
+                "CXX": "ccache g++ -" + self._options.arch,
+            })
+
+            run_batch_command([self._src_dir + "/configure", 
+                               "--prefix=" + self._build_root] + \
+                              flags + self._configure_options, env=env)
+
+            planner = JobPlanner(self._options.arch)
+            print "INFO: job plan: " + str(planner)
+            run_batch_command(["make",  "-j", 
+                               str(planner.make_jobs())], env=self._env)
+            if self.install:
+                run_batch_command(["make",  '-j', str(planner.make_jobs()), "install"],
+                                  env=self._env)
 
-        os.chdir(savedir)
+            os.chdir(savedir)
+            ccache.record_stats()
+        finally:
+            ccache.finish()
 
         if self._export:
             Export().export()
@@ -288,7 +633,7 @@ class AutoBuilder(object):
 
         try:
             run_batch_command(["make",  "-k", "-j", 
-                               str(cpu_count()),
+                               str(JobPlanner(self._options.arch).test_jobs()),
                                "check"], env=self._env)
         except(subprocess.CalledProcessError):
             print "WARN: make check failed"
@@ -349,11 +694,21 @@ class CMakeBuilder(object):
            'LD_LIBRARY_PATH': get_libdir(),
         }
         self._options.update_env(env)
-        run_batch_command(["cmake", "-GNinja", self._src_dir, 
-                           "-DCMAKE_INSTALL_PREFIX:PATH=" + self._build_root] \
-                          + self._extra_definitions, env=env)
-
-        run_batch_command(["ninja", "-j" + str(cpu_count())], env=env)
+        ccache = Ccache(self._options)
+        try:
+            ccache.update_env(env)
+            ccache.start()
+            planner = JobPlanner(self._options.arch)
+            print "INFO: job plan: " + str(planner)
+            run_batch_command(["cmake", "-GNinja", self._src_dir, 
+                               "-DCMAKE_INSTALL_PREFIX:PATH=" + self._build_root] \
+                              + cmake_job_pools(planner) \
+                              + self._extra_definitions, env=env)
+
+            run_batch_command(["ninja", "-j" + str(planner.compile_jobs())], env=env)
+            ccache.record_stats()
+        finally:
+            ccache.finish()
         if self._install:
             print "Installing: output suppressed"
             run_batch_command(["ninja", "install"], streamedOutput=False, quiet=True)
@@ -434,10 +789,22 @@ class MesonBuilder(object):
                 'x86-linux-gcc.cross' if self._compiler != 'clang' else 'x86-linux-clang.cross')]
         else:
             cross_file = []
-        run_batch_command(['meson', self._build_dir, '--prefix', self._build_root,
-                           '--libdir', 'lib'] + cross_file + self._extra_definitions,
-                           env=env)
-        run_batch_command(['ninja', '-j', str(cpu_count()), '-C', self._build_dir])
+        ccache = Ccache(self._options)
+        try:
+            ccache.update_env(env)
+            ccache.start()
+            planner = JobPlanner(self._options.arch)
+            print "INFO: job plan: " + str(planner)
+            run_batch_command(['meson', self._build_dir, '--prefix', self._build_root,
+                               '--libdir', 'lib',
+                               '-Dbackend_max_links=' + str(planner.link_jobs())] +
+                              cross_file + self._extra_definitions,
+                               env=env)
+            run_batch_command(['ninja', '-j', str(planner.compile_jobs()), '-C', self._build_dir],
+                              env=ccache.update_env({}))
+            ccache.record_stats()
+        finally:
+            ccache.finish()
         if self._install:
             print "Installing: output suppressed"
             run_batch_command(['ninja', '-C', self._build_dir, 'install'],
@@ -807,11 +1174,20 @@ class PiglitTester(object):
         streamedOutput = True
         if o.retest_path:
             streamedOutput = False
-        (out, err) = run_batch_command(cmd + exclude_cmd + include_tests +
-                                       concurrency_options + [self.suite, out_dir ],
-                                       env=self.env,
-                                       expected_return_code=None,
-                                       streamedOutput=streamedOutput)
+        # piglit writes a junit fragment for each completed test, which
+        # are exported periodically while the tests run.
+        partial = PartialTestExport("_".join([pm.current_project(),
+                                              hardware, o.arch]))
+        partial.watch(out_dir + "/tests")
+        try:
+            (out, err) = run_batch_command(cmd + exclude_cmd + include_tests +
+                                           concurrency_options + [self.suite, out_dir ],
+                                           env=self.env,
+                                           expected_return_code=None,
+                                           streamedOutput=streamedOutput)
+        finally:
+            partial.stop()
+        partial.flush()
         if err and "There are no tests scheduled to run" in err:
             open(out_dir + "/results.xml", "w").write("<testsuites/>")
 
@@ -834,29 +1210,40 @@ class PiglitTester(object):
                               out_dir + "/results.xml",
                               final_file)
 
-        if "bsw" == hardware:
-            # run piglit again, to eliminate intermittent failures
+        # run piglit again, to eliminate intermittent failures.  On bsw
+        # all failures are retested, elsewhere only those with a history
+        # of flaky results.
+        retest_list = []
+        if os.path.exists(final_file):
             tl = TestLister(final_file)
-            retests = tl.RetestIncludes("piglit-test")
-            if retests:
-                second_out_dir = out_dir + "/retest"
-                print "WARN: retesting piglit to " + second_out_dir
-                (out, err) = run_batch_command(cmd + exclude_cmd + retests +
-                                               concurrency_options + [self.suite, second_out_dir ],
-                                               env=self.env,
-                                               expected_return_code=None,
-                                               streamedOutput=streamedOutput)
-                second_results = TestLister(second_out_dir + "/results.xml")
-                for a_test in tl.TestsNotIn(second_results):
-                    print "stripping flaky test: " + a_test.test_name
-                    a_test.ForcePass(final_file)
-                rmtree(second_out_dir)
+            flaky = FlakyTests.published()
+            for a_test in tl.Tests("piglit-test"):
+                if ("bsw" == hardware or
+                    flaky.is_flaky(a_test.test_name, a_test.hardware, a_test.arch)):
+                    retest_list.append(a_test)
+        retests = []
+        for a_test in retest_list:
+            retests += a_test.RetestInclude()
+        if retests:
+            second_out_dir = out_dir + "/retest"
+            print "WARN: retesting piglit to " + second_out_dir
+            (out, err) = run_batch_command(cmd + exclude_cmd + retests +
+                                           concurrency_options + [self.suite, second_out_dir ],
+                                           env=self.env,
+                                           expected_return_code=None,
+                                           streamedOutput=streamedOutput)
+            second_results = TestLister(second_out_dir + "/results.xml")
+            for a_test in tl.TestsNotIn(second_results):
+                if a_test not in retest_list:
+                    continue
+                print "stripping flaky test: " + a_test.test_name
+                a_test.ForcePass(final_file)
+            rmtree(second_out_dir)
 
         # create a copy of the test xml in the source root, where
         # jenkins can access it.
-        cmd = ["cp", "-a",
-               self.build_root + "/../test", pm.source_root()]
-        run_batch_command(cmd)
+        partial.finish()
+        snapshot(self.build_root + "/../test", pm.source_root())
 
         check_gpu_hang()
         Export().export_tests()
@@ -964,19 +1351,22 @@ class CtsBuilder(CMakeBuilder):
         # one relative #include in this project, which breaks when the repo is
         # symlinked.
         kc_cts_dir = self._src_dir + "/external/kc-cts"
-        if os.path.exists(kc_cts_dir):
-            shutil.rmtree(kc_cts_dir)
         if self._suite == "gl":
+            # only files which changed since the last build are copied
             kc_cts_dest = os.path.join(kc_cts_dir, "src")
-            if not os.path.exists(kc_cts_dir):
-                os.mkdir(kc_cts_dir)
-            kc_cts_src = os.path.join(self._src_dir, "../kc-cts")
-            shutil.copytree(kc_cts_src, kc_cts_dest)
+            kc_cts_src = os.path.normpath(os.path.join(self._src_dir, "../kc-cts"))
+            sync_tree(kc_cts_src, kc_cts_dest)
+        elif os.path.exists(kc_cts_dir):
+            shutil.rmtree(kc_cts_dir)
         # change spirv-tools and glslang to use the commits specified
         # in the vulkancts sources
         sys.path = [os.path.abspath(os.path.normpath(s)) for s in sys.path]
         sys.path = [gooddir for gooddir in sys.path if "cts" not in gooddir]
         sys.path.append(self._src_dir + "/external/")
+        # compiled modules would be left in the source tree, and
+        # prevent the next clean from being skipped
+        dont_write_bytecode = sys.dont_write_bytecode
+        sys.dont_write_bytecode = True
         fetch_sources = importlib.import_module("fetch_sources", ".")
         packages = fetch_sources.PACKAGES
         if self._suite == "gl":
@@ -986,7 +1376,9 @@ class CtsBuilder(CMakeBuilder):
                 packages += fetch_kc_cts_sources.PACKAGES
             except ImportError:
                 fetch_kc_cts_sources = []
+        sys.dont_write_bytecode = dont_write_bytecode
 
+        trees = []
         for package in packages:
             try:
                 if not isinstance(package, fetch_sources.GitRepo):
@@ -994,27 +1386,27 @@ class CtsBuilder(CMakeBuilder):
             except:
                 continue
             repo_path = self._src_dir + "/external/" + package.baseDir + "/src/"
-            print "Cleaning: " + repo_path + " : " + package.revision
-            savedir = os.getcwd()
             if os.path.exists(repo_path):
-                os.chdir(repo_path)
-                run_batch_command(["git", "clean", "-xfd"])
-                run_batch_command(["git", "reset", "--hard", "HEAD"])
-                os.chdir(savedir)
-                print "Checking out: " + repo_path + " : " + package.revision
-                repo = git.Repo(repo_path)
-                repo.git.checkout(package.revision, force=True)
+                trees.append((repo_path, package.revision))
             else:
                 print("WARN: Repo path does not exist: {}".format(repo_path))
 
+        # external repos are independent of the cts repo, so they are
+        # prepared while local patches are applied.
+        pool = multiprocessing.pool.ThreadPool(1)
+        prepared = pool.apply_async(prepare_git_trees, (trees,))
+        pool.close()
+
         # apply patches if they exist
-        for patch in sorted(glob.glob(pm.project_build_dir() + "/*.patch")):
-            os.chdir(self._src_dir)
-            try:
-                run_batch_command(["git", "am", patch])
-            except:
-                print "WARN: failed to apply patch: " + patch
-                run_batch_command(["git", "am", "--abort"])
+        try:
+            apply_patches(self._src_dir,
+                          sorted(glob.glob(pm.project_build_dir() + "/*.patch")))
+        finally:
+            pool.join()
+        failures = prepared.get()
+        if failures:
+            raise RuntimeError("failed to prepare external sources: " +
+                               ", ".join(sorted(failures.keys())))
 
         if not os.path.exists(self._build_dir):
             os.makedirs(self._build_dir)
@@ -1033,22 +1425,31 @@ class CtsBuilder(CMakeBuilder):
                "CXXFLAGS":cxxflag,
                "PKG_CONFIG_PATH":get_package_config_path()}
         self._options.update_env(env)
-        kc_cts_target = ""
-        if self._suite == "gl":
-            kc_cts_target = "-DGLCTS_GTF_TARGET=gl"
-
-        run_batch_command(["cmake", "-GNinja", kc_cts_target, self._src_dir] + self._extra_definitions,
-                             env=env)
-
-        run_batch_command(["ninja","-j" + str(cpu_count())], env=env)
+        ccache = Ccache(self._options)
+        try:
+            ccache.update_env(env)
+            ccache.start()
+            kc_cts_target = ""
+            if self._suite == "gl":
+                kc_cts_target = "-DGLCTS_GTF_TARGET=gl"
+
+            planner = JobPlanner(self._options.arch)
+            print "INFO: job plan: " + str(planner)
+            run_batch_command(["cmake", "-GNinja", kc_cts_target, self._src_dir] +
+                              cmake_job_pools(planner) + self._extra_definitions,
+                                 env=env)
+
+            run_batch_command(["ninja","-j" + str(planner.compile_jobs())], env=env)
+            ccache.record_stats()
+        finally:
+            ccache.finish()
         install_dir = pm.build_root() + "/bin/" + self._suite
         binary_dir = self._build_dir + "/external/openglcts/modules"
         run_batch_command(["mkdir", "-p", install_dir])
-        run_batch_command(["cp", "-a", binary_dir,
-                              install_dir])
+        snapshot(binary_dir, install_dir)
 
-        run_batch_command(["cp", "-a", self._build_dir + "/external/openglcts/modules/gl_cts/data/mustpass/gles/khronos_mustpass",
-                              pm.build_root() + "/share"])
+        snapshot(self._build_dir + "/external/openglcts/modules/gl_cts/data/mustpass/gles/khronos_mustpass",
+                 pm.build_root() + "/share")
 
         os.chdir(savedir)
 
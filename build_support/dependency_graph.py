@@ -44,6 +44,11 @@ class DependencyGraph:
         # require it
         self._completion_graph = {}
 
+        # key is ProjectInvoke hash string, value is the estimated
+        # time from triggering the build to completing all builds
+        # which depend on it
+        self._critical_path = {}
+
         # key is project name, value is project tag
         self._project_tags = {}
         build_spec = ProjectMap().build_spec()
@@ -59,6 +64,11 @@ class DependencyGraph:
                                options=options)
             self.add_to_graph(bi)
 
+        # build_complete consumes _dependency_graph.  Keep a copy to
+        # find the long pole when the builds are done.
+        self._full_graph = dict([(k, list(v)) for (k, v)
+                                 in self._dependency_graph.items()])
+
     def ready_builds(self, filter_builds=None):
         """provide a list of builds which have all prerequisites
         satisfied."""
@@ -72,8 +82,44 @@ class DependencyGraph:
         ret_list = [j for j in ret_list 
                     if str(j) not in filter_builds_str]
 
+        # start the longest chains of builds first
+        ret_list.sort(key=lambda j: self._critical_path.get(str(j), 0),
+                      reverse=True)
         return ret_list
 
+    def prioritize(self, durations):
+        """orders ready_builds by the estimated length of the critical
+        path through each build.  durations is a BuildDurations."""
+        estimates = durations.estimates()
+        duration = {}
+        for component in self._dependency_graph:
+            invoke = ProjectInvoke(from_string=component)
+            duration[component] = estimates.get(durations.key(invoke))
+        known = [d for d in duration.values() if d is not None]
+        # builds without history are assumed to be typical
+        default = 1
+        if known:
+            default = sum(known) / len(known)
+
+        dependents = {}
+        for (component, prereqs) in self._dependency_graph.items():
+            for a_prereq in prereqs:
+                dependents.setdefault(a_prereq, []).append(component)
+
+        critical_path = {}
+        def path_length(component):
+            if component not in critical_path:
+                own = duration.get(component)
+                if own is None:
+                    own = default
+                critical_path[component] = own + max(
+                    [path_length(d) for d in dependents.get(component, [])]
+                    + [0])
+            return critical_path[component]
+        for component in self._dependency_graph:
+            path_length(component)
+        self._critical_path = critical_path
+
     def all_builds(self):
         ret_list = []
         for k in self._dependency_graph.keys():
@@ -102,17 +148,25 @@ class DependencyGraph:
         del self._completion_graph[build]
 
     @classmethod
-    def long_pole(cls, invoke):
-        """returns a list of invokes composing the long pole of the build"""
-        depGraph = cls(invoke.project, 
-                       invoke.options)
+    def long_pole(cls, invoke, depGraph=None, end_times=None):
+        """returns a list of invokes composing the long pole of the
+        build.  depGraph is the graph that scheduled the builds, and
+        end_times maps invoke strings to end times that are already
+        known."""
+        if not depGraph:
+            depGraph = cls(invoke.project, 
+                           invoke.options)
+        if not end_times:
+            end_times = {}
         blocking_builds = [invoke]
         while True:
             last_build = None
             last_finish_time = 0
-            for a_dep in depGraph._dependency_graph[str(invoke)]:
+            for a_dep in depGraph._full_graph[str(invoke)]:
+                end_time = end_times.get(a_dep)
                 a_dep = ProjectInvoke(from_string=a_dep)
-                end_time = a_dep.get_info("end_time")
+                if not end_time:
+                    end_time = a_dep.get_info("end_time", block=False)
                 if not end_time:
                     continue
                 if end_time > last_finish_time:
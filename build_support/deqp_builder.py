@@ -12,6 +12,13 @@ import xml.sax.saxutils as saxutils
 from . import *
 from .builders import get_libdir, get_libgl_drivers
 
+# junit status of deqp result codes, for partial results and retries
+PARTIAL_STATUS = {"pass": "pass",
+                  "qualitywarning": "pass",
+                  "compatibilitywarning": "pass",
+                  "notsupported": "skip",
+                  "fail": "fail"}
+
 class DeqpTrie:
     def __init__(self):
         self._trie = {}
@@ -20,6 +27,8 @@ class DeqpTrie:
         self._duration = {}
         self._stdout = {}
         self._stderr = {}
+        # status of the first attempt of tests which were retried
+        self._first_result = {}
 
     def empty(self):
         return not self._trie
@@ -234,6 +243,8 @@ class DeqpTrie:
         err = [e for e in err if "Mesa: " not in e]
         if len(split_test_name) == 1:
             test = split_test_name[0] 
+            if test in self._result:
+                self._first_result.setdefault(test, self._result[test])
             self._trie[test] = DeqpTrie()
             self._content[test] = blob
             self._duration[test] = 0.0
@@ -276,6 +287,35 @@ class DeqpTrie:
             self._trie[group] = DeqpTrie()
         self._trie[group].add_qpa_blob(split_test_name[1:], blob, pid, full_test_name, err)
 
+    def tests(self, prefix=""):
+        """full names of tests with results"""
+        names = []
+        for test_name in self._result:
+            if prefix:
+                test_name = prefix + "." + test_name
+            names.append(test_name)
+        for group, t in iter(self._trie.items()):
+            if prefix:
+                group = prefix + "." + group
+            names += t.tests(group)
+        return names
+
+    def failures(self, prefix=""):
+        """full names of tests which did not pass or skip.  Warnings
+        are passes, as in the junit results."""
+        failed = []
+        for test_name, status in self._result.items():
+            if PARTIAL_STATUS.get(status.lower()) in ["pass", "skip"]:
+                continue
+            if prefix:
+                test_name = prefix + "." + test_name
+            failed.append(test_name)
+        for group, t in iter(self._trie.items()):
+            if prefix:
+                group = prefix + "." + group
+            failed += t.failures(group)
+        return failed
+
     def write_junit(self, of, config, missing_commits):
         of.write("<testsuites>\n")
         for group, t in iter(self._trie.items()):
@@ -284,22 +324,32 @@ class DeqpTrie:
             of.write(" </testsuite>\n")
         of.write("</testsuites>")
         
+    @staticmethod
+    def _junit_status(test_name, status):
+        status = status.lower()
+        if status == "notsupported":
+            status = "skip"
+        if status == "internalerror":
+            status = "crash"
+        if status not in ["pass", "crash", "skip", "fail"]:
+            print "WARN: invalid status: " + test_name + " : " + status
+            status = "fail"
+        return status
+
     def _write_junit_tag(self, of, prefix, config, missing_commits):
         for test_name in self._result:
-            status = self._result[test_name].lower()
-            if status == "notsupported":
-                status = "skip"
-            if status == "internalerror":
-                status = "crash"
-            if status not in ["pass", "crash", "skip", "fail"]:
-                print "WARN: invalid status: " + test_name + " : " + status
-                status = "fail"
+            status = self._junit_status(test_name, self._result[test_name])
+            first_status = None
+            if test_name in self._first_result:
+                first_status = self._junit_status(test_name,
+                                                  self._first_result[test_name])
             config.write_junit(of, prefix, test_name,
                                status,
                                self._duration[test_name],
                                self._stdout[test_name],
                                self._stderr[test_name],
-                               missing_commits)
+                               missing_commits,
+                               first_status)
         for group in self._trie:
             self._trie[group]._write_junit_tag(of, prefix + "." + group, config, missing_commits)
 
@@ -344,6 +394,9 @@ class ConfigFilter(object):
         self._expected_crash = {}
         self._fixed = {}
         self._suffix = options.hardware + options.arch
+        self._hardware = options.hardware
+        self._arch = options.arch
+        self._flaky = FlakyTests.published()
         with open(file_path, "r") as fh:
             p = CaseConfig(allow_no_value=True)
             p.optionxform = str
@@ -368,10 +421,12 @@ class ConfigFilter(object):
 
     def write_junit(self, of,
                     suite, test_name, status, duration, stdout, stderr,
-                    missing_commits):
+                    missing_commits, first_status=None):
         """
         interprets test status with the config, filtering failures for
         tests which have changed status in the missing_commits.
+        first_status is the status of the first attempt of a retried
+        test.
         """
         full_test_name = suite + "." + test_name
         filtered_status = status
@@ -405,6 +460,12 @@ class ConfigFilter(object):
         elif full_test_name in self._fixed:
             commit_filter = self._fixed[full_test_name]
 
+        if status in ["fail", "crash"]:
+            score = self._flaky.score(full_test_name, self._hardware, self._arch)
+            if score:
+                stdout += ("\nWARN: this test has a history of intermittent "
+                           "results (flakiness {0:.2f}).".format(score))
+
         for word in commit_filter.split():
             if word in missing_commits:
                 stdout += "\nWARN: this test had status " + status + \
@@ -419,10 +480,16 @@ class ConfigFilter(object):
         # based on config changes whether the tag has a <failure> or
         # <skipped> subtag, which is how jenkins reports results.  We
         # need the "real" test status for handling bisection.
-        of.write("""  <testcase classname="{}" name="{}" status="{}" time="{}">\n""".format(suite,
-                                                                                            test_name + "." + self._suffix,
-                                                                                            status,
-                                                                                            duration))
+        # first_status records a retried failure in the results
+        # database.
+        first_attrib = ""
+        if first_status and first_status != status:
+            first_attrib = ' first_status="{}"'.format(first_status)
+        of.write("""  <testcase classname="{}" name="{}" status="{}" time="{}"{}>\n""".format(suite,
+                                                                                              test_name + "." + self._suffix,
+                                                                                              status,
+                                                                                              duration,
+                                                                                              first_attrib))
         if filtered_status == "skip":
             of.write("""   <skipped type="skip"/>\n""")
         if filtered_status == "fail":
@@ -439,6 +506,7 @@ class DeqpTester:
     def __init__(self):
         self.o = Options()
         self.pm = ProjectMap()
+        self._partial = None
 
     def test(self, binary, list_policy, extra_args=None, env=None):
         if extra_args is None:
@@ -496,7 +564,7 @@ class DeqpTester:
         shard_tests.add_txt("mesa-ci-caselist.txt")
         full_test_count = shard_tests.test_count()
         print "Total test count: " + str(full_test_count) + "\n"
-        cpus = multiprocessing.cpu_count()
+        cpus = JobPlanner(self.o.arch).test_jobs()
         base_commands = [binary,
                          "--deqp-log-images=disable",
                          "--deqp-gl-config-name=rgba8888d24s8",
@@ -553,6 +621,13 @@ class DeqpTester:
 
         completed_tests = 0 # for status only.  accurate count is
         completion_fh = {}  # maintained in the results object.
+        # test name and status of the test in progress on each cpu,
+        # which are exported periodically while the tests run.
+        partial_state = {}
+        self._partial = PartialTestExport("_".join([self.pm.current_project(),
+                                                    self.o.hardware,
+                                                    self.o.arch,
+                                                    self.o.shard]))
         completion_interval = 0
         completion_percentage = 0
         max_crash_cnt = 1000
@@ -591,8 +666,16 @@ class DeqpTester:
                             completion_fh[cpu] = open(out_fn, "r")
                     if cpu in completion_fh:
                         for line in completion_fh[cpu].readlines():
-                            if line == "#endTestCaseResult\n":
+                            if line.startswith("#beginTestCaseResult "):
+                                partial_state[cpu] = [line.split()[1], "crash"]
+                            elif "<Result StatusCode=" in line and cpu in partial_state:
+                                code = line.split('StatusCode="')[1].split('"')[0]
+                                partial_state[cpu][1] = PARTIAL_STATUS.get(code.lower(),
+                                                                           "crash")
+                            elif line == "#endTestCaseResult\n":
                                 completed_tests += 1
+                                if cpu in partial_state:
+                                    self._partial.add(*partial_state.pop(cpu))
 
                 proc.poll()
                 if proc.returncode is None:
@@ -604,6 +687,9 @@ class DeqpTester:
                 if not single_proc:
                     completion_fh[cpu].close()
                     del completion_fh[cpu]
+                    if cpu in partial_state:
+                        # crashed
+                        self._partial.add(*partial_state.pop(cpu))
                 test_count = results.results_count()
                 proc.err_fh.seek(0)
                 errors = proc.err_fh.readlines()
@@ -652,11 +738,52 @@ class DeqpTester:
                 proc.err_fh = err_fh
                 procs[cpu] = proc
 
+        self._retry_flaky(results, base_commands, procEnv, out_fh)
+        self._partial.flush()
         os.remove("mesa-ci-caselist.txt")
         os.chdir(savedir)
         return results
         
-    def parse_qpa_results(self, results_trie, filename, pid, err):
+    def _retry_flaky(self, results, base_commands, env, out_fh):
+        """runs failing tests with a history of flaky results a second
+        time, in a single process.  The results of tests which pass on
+        retry replace the failures, which are kept as the status of the
+        first attempt."""
+        flaky = FlakyTests.published()
+        retests = [test_name for test_name in results.failures()
+                   if flaky.is_flaky(test_name, self.o.hardware, self.o.arch)]
+        if not retests:
+            return
+        case_fn = "mesa-ci-caselist-retry.txt"
+        out_fn = "TestResults-retry.qpa"
+        with open(case_fn, "w") as fh:
+            for test_name in sorted(retests):
+                fh.write(test_name + "\n")
+        if os.path.exists(out_fn):
+            os.remove(out_fn)
+        print "WARN: retrying " + str(len(retests)) + " flaky tests"
+        proc = subprocess.Popen(base_commands + ["--deqp-log-filename=" + out_fn,
+                                                 "--deqp-caselist-file=" + case_fn],
+                                stdout=out_fh,
+                                stderr=out_fh,
+                                env=env)
+        proc.wait()
+        os.remove(case_fn)
+        if not os.path.exists(out_fn):
+            return
+        retry = DeqpTrie()
+        self.parse_qpa_results(retry, out_fn, pid=proc.pid, err=[])
+        still_failing = set(retry.failures())
+        passed = [test_name for test_name in retry.tests()
+                  if test_name not in still_failing]
+        for test_name in passed:
+            print "WARN: flaky test passed on retry: " + test_name
+        self.parse_qpa_results(results, out_fn, pid=proc.pid, err=[],
+                               tests=set(passed))
+
+    def parse_qpa_results(self, results_trie, filename, pid, err, tests=None):
+        """adds the results in a qpa file to results_trie.  If tests is
+        provided, other results are ignored."""
         with open(filename, "r") as qpa:
             current_test = ""
             blob = []
@@ -666,7 +793,8 @@ class DeqpTester:
                     current_test = line[len("#beginTestCaseResult "):]
                     continue
                 if line.startswith("#endTestCaseResult"):
-                    results_trie.add_qpa_blob(current_test.split("."), blob, pid, current_test)
+                    if tests is None or current_test in tests:
+                        results_trie.add_qpa_blob(current_test.split("."), blob, pid, current_test)
                     blob = []
                     current_test = ""
                     continue
@@ -674,7 +802,7 @@ class DeqpTester:
                     continue
                 
                 blob.append(line.decode('utf-8','ignore').encode('utf-8'))
-            if current_test:
+            if current_test and (tests is None or current_test in tests):
                 # crashed
                 print("WARN - crashed test: " + current_test)
                 results_trie.add_qpa_blob(current_test.split("."), blob, pid, current_test, err)
@@ -683,19 +811,23 @@ class DeqpTester:
         out_dir = self.pm.build_root() + "/../test"
         if not os.path.exists(out_dir):
             os.makedirs(out_dir)
-        with open(out_dir + "/piglit-" + self.pm.current_project() + "_" + self.o.hardware + "_" + self.o.arch + "_" + self.o.shard + ".xml", "w") as of:
+        out_file = out_dir + "/piglit-" + self.pm.current_project() + "_" + self.o.hardware + "_" + self.o.arch + "_" + self.o.shard + ".xml"
+        # written atomically, as partial results may be exported while
+        # the file is generated
+        with open(out_file + ".tmp", "w") as of:
             commits = {}
             for commit in RepoSet().branch_missing_revisions():
                 commits[str(commit)] = True
             results_trie.write_junit(of, config_policy, commits)
+        os.rename(out_file + ".tmp", out_file)
+        if self._partial:
+            self._partial.finish()
 
         check_gpu_hang()
 
         # create a copy of the test xml in the source root, where
         # jenkins can access it.
-        cmd = ["cp", "-a",
-               self.pm.build_root() + "/../test", self.pm.source_root()]
-        run_batch_command(cmd)
+        snapshot(self.pm.build_root() + "/../test", self.pm.source_root())
 
         Export().export_tests()
 
@@ -26,16 +26,26 @@
 #  **********************************************************************/
 
 """handles synchronization of the build_root with the results directory"""
+import hashlib
+import json
+import multiprocessing.pool
 import os
 import random
 import socket
+import stat
 import subprocess
+import tempfile
+import threading
 import time
+import uuid
 import xml.sax.saxutils
 from . import run_batch_command
 from . import rmtree
 from . import Options
 from . import ProjectMap
+from . import snapshot
+from . import ArtifactStore
+from . import ImportCache
 
 def convert_rsync_path(path):
     hostname = ProjectMap().build_spec().find("build_master").attrib["hostname"]
@@ -46,6 +56,136 @@ def convert_rsync_path(path):
         return path.replace("/mnt/jenkins/", repl_path)
     return None
 
+# number of concurrent rsync streams used to export changed files
+EXPORT_STREAMS = 4
+
+# rsync compression only pays off for text.  Binaries (libraries,
+# executables, compressed archives) are sent without the zlib pass.
+COMPRESSIBLE_SUFFIXES = (".xml", ".txt", ".json", ".log", ".csv", ".qpa",
+                         ".py", ".c", ".h", ".cpp", ".hpp", ".pc", ".la",
+                         ".sh", ".cmake", ".ini", ".conf", ".html")
+
+# each export manifest pushes a marker file named after its id to the
+# destination, which identifies the manifest that describes the
+# destination's copy of the tree.
+MARKER_PREFIX = ".export-"
+
+def _file_hash(path):
+    if os.path.islink(path):
+        return hashlib.md5(os.readlink(path)).hexdigest()
+    h = hashlib.md5()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), ""):
+            h.update(block)
+    return h.hexdigest()
+
+class ExportManifest:
+    """records the size, mtime and hash of each file under a tree, as
+    of the last time it was pushed to a destination.  The manifest is
+    kept next to the tree, keyed by destination."""
+    def __init__(self, tree, dest):
+        self.tree = os.path.abspath(tree)
+        self.name = os.path.basename(self.tree)
+        key = hashlib.md5(dest + "/" + self.name).hexdigest()[:16]
+        self._path = os.path.join(os.path.dirname(self.tree),
+                                  ".export_manifest_" + key + ".json")
+        self.id = None
+        self.files = {}
+        try:
+            with open(self._path) as fh:
+                data = json.load(fh)
+            self.id = data["id"]
+            self.files = data["files"]
+        except (IOError, ValueError, KeyError):
+            pass
+
+    def marker(self):
+        """file name in the tree which identifies this manifest on
+        the destination"""
+        return MARKER_PREFIX + self.id
+
+    def reset(self):
+        """forget all files, as the destination does not match"""
+        if self.id:
+            marker = os.path.join(self.tree, self.marker())
+            if os.path.exists(marker):
+                os.unlink(marker)
+        self.id = uuid.uuid4().hex[:16]
+        self.files = {}
+        open(os.path.join(self.tree, self.marker()), "w").close()
+
+    def scan(self):
+        """returns the list of (relative path, size) which differ from
+        the manifest, along with the total size of the tree"""
+        changed = []
+        total = 0
+        for (dirpath, dirnames, filenames) in os.walk(self.tree):
+            if not dirnames and not filenames and dirpath != self.tree:
+                # rsync --files-from only creates the parents of
+                # listed files, so empty directories are listed
+                filenames = [""]
+            for a_dir in dirnames:
+                # os.walk does not follow links to directories
+                if os.path.islink(os.path.join(dirpath, a_dir)):
+                    filenames.append(a_dir)
+            for a_file in filenames:
+                path = os.path.join(dirpath, a_file)
+                rel = os.path.relpath(path, self.tree)
+                if (rel.startswith(MARKER_PREFIX) and self.id and
+                    rel != self.marker()):
+                    # markers of other manifests for the destination
+                    continue
+                try:
+                    st = os.lstat(path)
+                except OSError:
+                    continue
+                total += st.st_size
+                entry = self.files.get(rel)
+                if entry and entry[0] == st.st_size and entry[1] == st.st_mtime:
+                    continue
+                if entry and entry[0] == st.st_size and entry[2]:
+                    if entry[2] == _file_hash(path):
+                        # touched, but not modified
+                        entry[1] = st.st_mtime
+                        continue
+                changed.append((rel, st.st_size))
+        return (changed, total)
+
+    def record(self, rel_paths, hash_files=True):
+        """marks files as present on the destination.  Without a hash,
+        any later change to the size or mtime of a file causes it to be
+        sent again."""
+        for rel in rel_paths:
+            path = os.path.join(self.tree, rel)
+            try:
+                st = os.lstat(path)
+            except OSError:
+                continue
+            digest = None
+            if hash_files and not stat.S_ISDIR(st.st_mode):
+                digest = _file_hash(path)
+            self.files[rel] = [st.st_size, st.st_mtime, digest]
+
+    def save(self):
+        tmp = self._path + ".tmp"
+        with open(tmp, "w") as fh:
+            json.dump({"id": self.id, "files": self.files}, fh)
+        os.rename(tmp, self._path)
+
+def _run_rsync(cmd):
+    try:
+        run_batch_command(cmd)
+    except subprocess.CalledProcessError as e:
+        print "WARN: some errors copying: " + str(e)
+        return False
+    return True
+
+# failures created by create_failing_test are collected into a single
+# file for each process, which is exported once per build action.
+_failing_tests = []
+_failing_test_file = None
+_failing_tests_exported = True
+
 class Export:
     def __init__(self):
         # todo: provide wildcard mechanism
@@ -63,17 +203,131 @@ class Export:
             self._dest = self.rsyncd_path
 
         
+    def _dest_has_marker(self, manifest):
+        proc = subprocess.Popen(["rsync", "--list-only", self._dest + "/" +
+                                 manifest.name + "/" + manifest.marker()],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        proc.communicate()
+        return proc.returncode == 0
+
+    def _reset_manifest(self, manifest):
+        """starts a new manifest for the destination, removing the marker
+        of the previous one so markers do not accumulate"""
+        old_marker = manifest.id and manifest.marker()
+        manifest.reset()
+        if not old_marker:
+            return
+        # deletes only the old marker from the destination directory
+        empty = tempfile.mkdtemp()
+        try:
+            proc = subprocess.Popen(["rsync", "-r", "--delete",
+                                     "--include=/" + old_marker,
+                                     "--exclude=*", empty + "/",
+                                     self._dest + "/" + manifest.name + "/"],
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE)
+            proc.communicate()
+        finally:
+            os.rmdir(empty)
+
+    def _delta_export(self, tree, verify=True):
+        """equivalent to "rsync -rlpzD tree dest", but only transfers
+        files which changed since the last export to dest"""
+        start = time.time()
+        manifest = ExportManifest(tree, self._dest)
+        if not manifest.id or (verify and not self._dest_has_marker(manifest)):
+            # first export, or the destination was removed
+            self._reset_manifest(manifest)
+        (changed, total) = manifest.scan()
+
+        # partition changed files into streams of similar size, and
+        # by whether they benefit from compression
+        streams = [([], []) for _ in range(EXPORT_STREAMS)]
+        sizes = [0] * EXPORT_STREAMS
+        sent = 0
+        for (rel, size) in sorted(changed, key=lambda c: -c[1]):
+            sent += size
+            i = sizes.index(min(sizes))
+            sizes[i] += size
+            text = rel.endswith(COMPRESSIBLE_SUFFIXES)
+            streams[i][0 if text else 1].append(rel)
+        jobs = []
+        parent = os.path.dirname(manifest.tree)
+        for (text, binary) in streams:
+            for (files, flags) in ((text, "-rlpzD"), (binary, "-rlpD")):
+                if files:
+                    jobs.append((files, flags))
+
+        def send(job):
+            (files, flags) = job
+            with tempfile.NamedTemporaryFile(prefix="export_", suffix=".list") as fh:
+                fh.write("\n".join([manifest.name + "/" + f for f in files]) + "\n")
+                fh.flush()
+                return _run_rsync(["rsync", flags, "--files-from=" + fh.name,
+                                   parent, self._dest])
+
+        if jobs:
+            pool = multiprocessing.pool.ThreadPool(len(jobs))
+            try:
+                results = pool.map(send, jobs)
+            finally:
+                pool.close()
+                pool.join()
+            for (job, success) in zip(jobs, results):
+                if success:
+                    manifest.record(job[0])
+        manifest.save()
+
+        elapsed = time.time() - start
+        skipped = total - sent
+        saved = ""
+        if sent > 1024 * 1024 and elapsed:
+            # estimated from the throughput of this export
+            saved = ", ~{0:.1f}s saved".format(skipped * elapsed / sent)
+        print ("INFO: exported {0} of {1} files from {2}: {3} of {4} bytes "
+               "sent in {5:.1f}s, {6} bytes skipped{7}".format(
+                   len(changed), len(manifest.files), tree, sent, total,
+                   elapsed, skipped, saved))
+
+    def seed_manifest(self, tree):
+        """records that tree is identical to its copy on the destination,
+        eg after it was imported from there"""
+        manifest = ExportManifest(tree, self._dest)
+        if manifest.id and self._dest_has_marker(manifest):
+            # the destination still carries this manifest's marker
+            manifest.files = {}
+            open(os.path.join(manifest.tree, manifest.marker()), "w").close()
+        else:
+            self._reset_manifest(manifest)
+        (changed, _) = manifest.scan()
+        # hashing the whole tree is not worth the cost, as an imported
+        # tree is mostly left unmodified.
+        manifest.record([rel for (rel, _) in changed
+                         if rel != manifest.marker()], hash_files=False)
+        manifest.save()
+        # sends only the marker
+        self._delta_export(tree, verify=False)
+
+    def _artifact_store(self):
+        """the blob store on the build master, if it is configured with
+        an artifact_store attribute"""
+        master = ProjectMap().build_spec().find("build_master")
+        store = master.attrib.get("artifact_store")
+        if not store:
+            return None
+        return ArtifactStore(convert_rsync_path(store))
+
     def export(self):
         if not self.result_path:
             return
 
-        cmd = ["rsync", "-rlpzD",
-               ProjectMap().build_root(), self._dest]
-
-        try:
-            run_batch_command(cmd)
-        except subprocess.CalledProcessError as e:
-            print "WARN: some errors copying: " + str(e)
+        store = self._artifact_store()
+        if store:
+            store.upload(ProjectMap().build_root(),
+                         self._dest + "/" + Options().arch + ".manifests",
+                         ProjectMap().current_project())
+        else:
+            self._delta_export(ProjectMap().build_root())
 
         self.export_tests()
 
@@ -85,14 +339,7 @@ class Export:
         if not os.path.exists(test_path):
             os.makedirs(test_path)
 
-        cmd = ["rsync", "-rlpzD",
-               test_path, 
-               self._dest]
-
-        try:
-            run_batch_command(cmd)
-        except subprocess.CalledProcessError as e:
-            print "WARN: some errors copying: " + str(e)
+        self._delta_export(test_path)
 
     def export_perf(self):
         if not self.result_path and os.name != "nt":
@@ -118,15 +365,55 @@ class Export:
         except subprocess.CalledProcessError as e:
             print "WARN: some errors copying: " + str(e)
 
+    def _listing(self, src):
+        """recursive rsync listing of src, which identifies the size and
+        mtime of every file in the exported tree"""
+        proc = subprocess.Popen(["rsync", "-r", "--list-only", src],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        (out, _) = proc.communicate()
+        if proc.returncode != 0:
+            return None
+        return out
+
+    def _cached_import(self, src, br):
+        """imports src into br through the host import cache.  Returns
+        False if the cache could not be used, eg because a concurrent
+        build evicted the entry."""
+        listing = self._listing(src)
+        if not listing:
+            return False
+        cache = ImportCache()
+        key = cache.key(Options().result_path, listing)
+        entry = cache.lookup(key)
+        if entry:
+            print "INFO: importing from cache: " + src
+        else:
+            try:
+                entry = cache.insert(key, lambda path: run_batch_command(
+                    ["rsync", "-rlptzD", "--exclude=/*/" + MARKER_PREFIX + "*",
+                     src, path]))
+            except subprocess.CalledProcessError as e:
+                print "WARN: some errors copying: " + str(e)
+                return False
+        name = os.path.basename(src)
+        try:
+            return cache.copy(key, name, os.path.join(br, name))
+        except subprocess.CalledProcessError as e:
+            print "WARN: could not copy cached import: " + str(e)
+            return False
+
     def import_build_root(self):
         o = Options()
         result_path = o.result_path + "/" + o.arch
         if not o.result_path:
             return
-        if not os.path.exists(result_path):
+        def exported():
+            return (os.path.exists(result_path) or
+                    os.path.exists(result_path + ".manifests"))
+        if not exported():
             print "WARN: no build root to import, sleeping"
             time.sleep(10)
-        if not os.path.exists(result_path):
+        if not exported():
             print "WARN: no build root to import: " + result_path
             return
 
@@ -134,7 +421,7 @@ class Export:
         if not os.path.exists(br):
             os.makedirs(br)
 
-        cmd = ["rsync", "-rlpzD", 
+        cmd = ["rsync", "-rlpzD", "--exclude=/*/" + MARKER_PREFIX + "*",
                self._dest + "/" + o.arch, br]
 
         # don't want to confuse test results with any preexisting
@@ -143,40 +430,227 @@ class Export:
         if os.path.exists(test_dir):
             rmtree(test_dir)
 
-        try:
-            run_batch_command(cmd)
-        except subprocess.CalledProcessError as e:
-            print "WARN: some errors copying: " + str(e)
+        store = self._artifact_store()
+        if store:
+            manifest = store.fetch_manifest(self._dest + "/" + o.arch + ".manifests")
+            if manifest:
+                store.materialize(manifest, ProjectMap().build_root())
+                return
+
+        if not self._cached_import(self._dest + "/" + o.arch, br):
+            try:
+                run_batch_command(cmd)
+            except subprocess.CalledProcessError as e:
+                print "WARN: some errors copying: " + str(e)
+                return
 
-    def create_failing_test(self, failure_name, output):
+        # the imported tree matches the destination, and need not be
+        # exported again.
+        self.seed_manifest(ProjectMap().build_root())
+
+    def create_failing_test(self, failure_name, output, flush=False):
+        """adds a generated failure to the failing test file of this
+        process.  The file is exported by flush_failing_tests(), which
+        is called at the end of each build action, or immediately if
+        flush is set."""
         o = Options()
-        pm = ProjectMap()
-        test_path = os.path.abspath(pm.build_root() + "/../test/")
         print "ERROR: creating a failing test: " + failure_name + " : " + output
-        if not os.path.exists(test_path):
-            os.makedirs(test_path)
-
-        randstr = socket.gethostname() + "_" + str(random.random())[2:6]
-        # filname has to begin with piglit for junit pattern match in jenkins to find it.
-        fh = open(test_path + "/piglit-fail-" + o.hardware + o.arch + "_" + randstr + ".xml", "w")
         failure_name = failure_name + "-" + o.hardware + o.arch
-        fh.write("""\
-<?xml version="1.0" encoding="UTF-8"?>
-<testsuites>
-  <testsuite name="generated-failures" tests="1">
+        _failing_tests.append("""\
     <testcase classname="failure-""" + failure_name + """\
 " name="compile.error" status="fail" time="0">
       <system-out>""" + xml.sax.saxutils.escape(output) + """</system-out>
       <failure type="fail" />
     </testcase>
-  </testsuite>
-</testsuites>""")
-        fh.close()
-        Export().export_tests()
+""")
+        self._write_failing_tests()
+        if flush:
+            self.flush_failing_tests()
+
+    def _write_failing_tests(self):
+        o = Options()
+        test_path = os.path.abspath(ProjectMap().build_root() + "/../test/")
+        if not os.path.exists(test_path):
+            os.makedirs(test_path)
+
+        global _failing_test_file
+        if not _failing_test_file:
+            randstr = socket.gethostname() + "_" + str(random.random())[2:6]
+            # filname has to begin with piglit for junit pattern match in jenkins to find it.
+            _failing_test_file = "piglit-fail-" + o.hardware + o.arch + "_" + randstr + ".xml"
+        out_file = test_path + "/" + _failing_test_file
+        with open(out_file + ".tmp", "w") as fh:
+            fh.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                     '<testsuites>\n'
+                     '  <testsuite name="generated-failures" tests="' +
+                     str(len(_failing_tests)) + '">\n')
+            fh.write("".join(_failing_tests))
+            fh.write("  </testsuite>\n</testsuites>")
+        os.rename(out_file + ".tmp", out_file)
+        global _failing_tests_exported
+        _failing_tests_exported = False
+
+    def flush_failing_tests(self):
+        """exports failing tests created since the last flush"""
+        global _failing_tests_exported
+        if not _failing_tests or _failing_tests_exported:
+            return
+        pm = ProjectMap()
+        # the test dir may have been cleaned since the failures were
+        # created
+        self._write_failing_tests()
+        self.export_tests()
 
         # create a copy of the test xml in the source root, where
         # jenkins can access it.
-        cmd = ["cp", "-a",
-               pm.build_root() + "/../test", pm.source_root()]
-        run_batch_command(cmd)
-        
+        snapshot(pm.build_root() + "/../test", pm.source_root())
+        _failing_tests_exported = True
+
+class PartialTestExport:
+    """exports the results of a running test job in batches, so they are
+    visible before the job completes and survive a timeout.  Batches are
+    written as junit chunks in test/partial/<job>/, and exported by a
+    background thread so the test job is not stalled by the rsync.
+    finish() marks the partial results as superseded by the final
+    result file."""
+    def __init__(self, job, interval=300, batch_size=1000):
+        pm = ProjectMap()
+        self._dir = os.path.abspath(pm.build_root() + "/../test/partial/" + job)
+        if os.path.exists(self._dir):
+            rmtree(self._dir)
+        os.makedirs(self._dir)
+        self._job = job
+        self._interval = interval
+        self._batch_size = batch_size
+        self._pending = []
+        self._chunk = 0
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+        self._exporter = None
+        self._export_requested = threading.Event()
+        self._export_pending = False
+        self._exporter_done = False
+
+    def add_testcase(self, testcase):
+        """testcase is a junit <testcase> element, as a string"""
+        with self._lock:
+            self._pending.append(testcase)
+            due = (len(self._pending) >= self._batch_size or
+                   time.time() - self._last_flush > self._interval)
+        if due:
+            self.flush()
+
+    def add(self, test_name, status, output=""):
+        """status is one of pass, fail, crash or skip"""
+        tag = ""
+        if status in ["fail", "crash"]:
+            tag = '<failure type="' + status + '" />'
+        elif status == "skip":
+            tag = "<skipped />"
+        self.add_testcase(
+            '<testcase classname="' + xml.sax.saxutils.escape(self._job) +
+            '" name=' + xml.sax.saxutils.quoteattr(test_name) +
+            ' status="' + status + '"><system-out>' +
+            xml.sax.saxutils.escape(output) + "</system-out>" + tag +
+            "</testcase>")
+
+    def flush(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+            self._last_flush = time.time()
+            if not pending:
+                return
+            self._chunk += 1
+            chunk = os.path.join(self._dir, "chunk-%05d.xml" % self._chunk)
+            with open(chunk + ".tmp", "w") as fh:
+                fh.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuites>\n'
+                         '<testsuite name="partial" tests="' +
+                         str(len(pending)) + '">\n')
+                for testcase in pending:
+                    fh.write(testcase + "\n")
+                fh.write("</testsuite>\n</testsuites>\n")
+            os.rename(chunk + ".tmp", chunk)
+        self._schedule_export()
+
+    def _schedule_export(self):
+        """requests made while an export is in progress are coalesced
+        into a single export after it completes"""
+        with self._lock:
+            if not self._exporter:
+                self._exporter_done = False
+                self._exporter = threading.Thread(target=self._export_loop)
+                self._exporter.daemon = True
+                self._exporter.start()
+            self._export_pending = True
+            self._export_requested.set()
+
+    def _export_loop(self):
+        while True:
+            self._export_requested.wait()
+            self._export_requested.clear()
+            with self._lock:
+                pending = self._export_pending
+                self._export_pending = False
+                done = self._exporter_done
+            if pending:
+                Export().export_tests()
+            if done:
+                return
+
+    def _stop_exporter(self):
+        """waits for pending exports to complete"""
+        with self._lock:
+            exporter = self._exporter
+            self._exporter = None
+            if not exporter:
+                return
+            self._exporter_done = True
+            self._export_requested.set()
+        exporter.join()
+
+    def watch(self, directory, suffix=".xml"):
+        """collects junit fragments as they are written to directory,
+        eg by the piglit junit backend"""
+        start = time.time()
+        def poll():
+            seen = set()
+            while not self._stop.wait(min(self._interval, 30)):
+                if not os.path.exists(directory):
+                    continue
+                for a_file in sorted(os.listdir(directory)):
+                    path = os.path.join(directory, a_file)
+                    if a_file in seen or not a_file.endswith(suffix):
+                        continue
+                    try:
+                        mtime = os.stat(path).st_mtime
+                        # skip fragments from earlier runs, and those
+                        # which may be partially written
+                        if mtime < start or time.time() - mtime < 2:
+                            continue
+                        with open(path) as fh:
+                            fragment = fh.read()
+                    except (IOError, OSError):
+                        continue
+                    seen.add(a_file)
+                    self.add_testcase(fragment)
+        self._watcher = threading.Thread(target=poll)
+        self._watcher.daemon = True
+        self._watcher.start()
+
+    def stop(self):
+        if self._watcher:
+            self._stop.set()
+            self._watcher.join()
+            self._watcher = None
+        self._stop_exporter()
+
+    def finish(self):
+        """called after the final results for the job have been written"""
+        self.stop()
+        with self._lock:
+            self._pending = []
+        open(os.path.join(self._dir, "complete"), "w").close()
+        Export().export_tests()
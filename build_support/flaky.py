@@ -0,0 +1,105 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+"""scores the flakiness of each test, from repeated runs of the test
+at the same revisions in the results database"""
+import json
+import os
+from . import ProjectMap
+
+# tests which gave different results in at least this fraction of
+# repeated revisions are retried rather than reported as failures
+FLAKY_THRESHOLD = 0.1
+
+def _key(test, hardware, arch):
+    return "|".join([test, hardware, arch])
+
+class FlakyTests:
+    """flakiness score per (test, hardware, arch), from 0 for tests which
+    are consistent to 1 for tests which never repeat a result"""
+    def __init__(self, scores=None, threshold=FLAKY_THRESHOLD):
+        self._scores = scores or {}
+        self._threshold = threshold
+
+    @classmethod
+    def from_db(cls, db, min_score=0.0):
+        """computes scores from a ResultsDB.  A revision which was run
+        more than once is inconsistent if it both passed and failed.
+        The score is the fraction of repeated revisions which were
+        inconsistent, with one consistent run assumed, so that a single
+        observation does not give a score of 1."""
+        repeated = {}
+        inconsistent = {}
+        for (test, hardware, arch, _, passes, fails) in db.repeated_results():
+            key = _key(test, hardware, arch)
+            repeated[key] = repeated.get(key, 0) + 1
+            if passes and fails:
+                inconsistent[key] = inconsistent.get(key, 0) + 1
+        scores = {}
+        for (key, count) in inconsistent.items():
+            score = float(count) / (repeated[key] + 1)
+            if score > min_score:
+                scores[key] = score
+        return cls(scores)
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path) as fh:
+                return cls(json.load(fh))
+        except (IOError, ValueError):
+            return cls()
+
+    @classmethod
+    def published(cls):
+        """scores published on the build master by the scheduler"""
+        try:
+            master = ProjectMap().build_spec().find("build_master")
+            return cls.load(cls.published_path(master.attrib["results_dir"]))
+        except Exception:
+            return cls()
+
+    @staticmethod
+    def published_path(results_dir):
+        return os.path.join(results_dir, "flaky.json")
+
+    def write(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "w") as fh:
+            json.dump(self._scores, fh, indent=0, sort_keys=True)
+        os.rename(tmp, path)
+
+    def score(self, test, hardware, arch):
+        # piglit results record only the platform of most skus
+        for hw in [hardware, hardware[:3]]:
+            key = _key(test, hw, arch)
+            if key in self._scores:
+                return self._scores[key]
+        return 0.0
+
+    def is_flaky(self, test, hardware, arch):
+        return self.score(test, hardware, arch) >= self._threshold
@@ -35,6 +35,7 @@ from . import ProjectMap
 from . import rmfile
 from . import run_batch_command
 from . import Export
+from . import snapshot
 
 class GTest:
     """Runs google test executables, publishing results to server"""
@@ -92,6 +93,4 @@ class GTest:
 
         # create a copy of the test xml in the source root, where
         # jenkins can access it.
-        cmd = ["cp", "-a",
-               br + "/../test", pm.source_root()]
-        run_batch_command(cmd)
+        snapshot(br + "/../test", pm.source_root())
@@ -0,0 +1,210 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+"""keeps recently imported build roots on test machines, so that
+consecutive jobs testing the same build do not fetch it again"""
+import contextlib
+import errno
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+try:
+    import fcntl
+except ImportError:
+    # windows
+    fcntl = None
+from . import run_batch_command
+
+# /tmp is used so that cached trees can be reflinked into the build
+# root, where the filesystem supports it.
+IMPORT_CACHE_DIR = "/tmp/mesa_ci_import_cache"
+IMPORT_CACHE_BUDGET = 20 * 1024 * 1024 * 1024
+# eviction also keeps this much space free on the filesystem
+IMPORT_CACHE_RESERVE = 5 * 1024 * 1024 * 1024
+# partially filled entries left behind by killed imports are removed
+# after this many seconds
+STALE_FILL_AGE = 24 * 60 * 60
+
+def _tree_size(path):
+    size = 0
+    for (dirpath, _, filenames) in os.walk(path):
+        for a_file in filenames:
+            try:
+                size += os.lstat(os.path.join(dirpath, a_file)).st_size
+            except OSError:
+                pass
+    return size
+
+class ImportCache:
+    """LRU cache of imported trees, keyed by result path and a hash of
+    the exported tree.  Several builds on a host share the cache, so
+    entries are filled in private directories and published with an
+    atomic rename.  Eviction holds a lock file, which readers of an
+    entry share.  Builds modify imported files in place, so entries are
+    copied out of the cache rather than linked."""
+    def __init__(self, cache_dir=IMPORT_CACHE_DIR, budget=IMPORT_CACHE_BUDGET,
+                 reserve=IMPORT_CACHE_RESERVE):
+        self._dir = cache_dir
+        self._budget = budget
+        self._reserve = reserve
+        if not os.path.exists(self._dir):
+            os.makedirs(self._dir)
+
+    def key(self, result_path, tree_id):
+        """tree_id is any string which changes when the exported tree
+        changes, eg a manifest or an rsync listing"""
+        return hashlib.md5(result_path + "\n" + tree_id).hexdigest()
+
+    def _info_file(self, key):
+        return os.path.join(self._dir, key + ".json")
+
+    def lookup(self, key):
+        """path of the cached tree, or None"""
+        path = os.path.join(self._dir, key)
+        if not os.path.exists(self._info_file(key)):
+            return None
+        # the modification time of the info file orders the LRU
+        os.utime(self._info_file(key), None)
+        return path
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive):
+        with open(os.path.join(self._dir, ".lock"), "a") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+
+    def copy(self, key, name, dest):
+        """copies name from the entry to dest.  Returns False if the
+        entry was evicted."""
+        with self._locked(exclusive=False):
+            path = os.path.join(self._dir, key, name)
+            if not os.path.exists(self._info_file(key)) or not os.path.exists(path):
+                return False
+            if not os.path.exists(os.path.dirname(dest)):
+                os.makedirs(os.path.dirname(dest))
+            # existing files are replaced rather than written, as they
+            # may be links to other trees
+            run_batch_command(["cp", "-a", "-T", "--reflink=auto",
+                               "--remove-destination", path, dest],
+                              quiet=True)
+        return True
+
+    def insert(self, key, fill):
+        """fill(path) populates a new cache entry.  Returns the path of
+        the entry."""
+        path = os.path.join(self._dir, key)
+        tmp = tempfile.mkdtemp(prefix=key + ".tmp.", dir=self._dir)
+        try:
+            fill(tmp)
+        except:
+            shutil.rmtree(tmp)
+            raise
+        size = _tree_size(tmp)
+        try:
+            os.rename(tmp, path)
+        except OSError as e:
+            if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                shutil.rmtree(tmp)
+                raise
+            # another build published the same tree first
+            shutil.rmtree(tmp)
+            size = _tree_size(path)
+        info = tempfile.NamedTemporaryFile(prefix=key + ".tmp.", dir=self._dir,
+                                           delete=False)
+        with info as fh:
+            json.dump({"size": size}, fh)
+        os.rename(info.name, self._info_file(key))
+        self.evict(keep=key)
+        return path
+
+    def entries(self):
+        """list of (last use, key, size), oldest first"""
+        entries = []
+        for a_file in os.listdir(self._dir):
+            if not a_file.endswith(".json"):
+                continue
+            info = os.path.join(self._dir, a_file)
+            try:
+                with open(info) as fh:
+                    size = json.load(fh)["size"]
+                entries.append((os.stat(info).st_mtime, a_file[:-5], size))
+            except (IOError, OSError, ValueError, KeyError):
+                continue
+        return sorted(entries)
+
+    def remove(self, key):
+        try:
+            os.unlink(self._info_file(key))
+        except OSError:
+            pass
+        # renamed first, so a concurrent remove of the same entry does
+        # not fail part way through
+        path = os.path.join(self._dir, key)
+        trash = tempfile.mkdtemp(prefix=key + ".evicted.", dir=self._dir)
+        try:
+            os.rename(path, os.path.join(trash, key))
+        except OSError:
+            pass
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def _remove_stale_fills(self):
+        for a_file in os.listdir(self._dir):
+            if ".tmp." not in a_file and ".evicted." not in a_file:
+                continue
+            path = os.path.join(self._dir, a_file)
+            try:
+                if time.time() - os.stat(path).st_mtime < STALE_FILL_AGE:
+                    continue
+            except OSError:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.unlink(path)
+
+    def evict(self, keep=None):
+        """removes least recently used entries until the cache fits in
+        its budget and the filesystem has the reserved free space"""
+        with self._locked(exclusive=True):
+            self._remove_stale_fills()
+            entries = self.entries()
+            used = sum([e[2] for e in entries])
+            st = os.statvfs(self._dir)
+            free = st.f_bavail * st.f_frsize
+            for (_, key, size) in entries:
+                if used <= self._budget and free >= self._reserve:
+                    break
+                if key == keep:
+                    continue
+                print "INFO: evicting cached import: " + key
+                self.remove(key)
+                used -= size
+                free += size
@@ -28,23 +28,43 @@
 import os
 import urllib
 import urllib2
-import ast
 import time
 import sys
 import signal
 import git
 import xml.sax.saxutils
+import multiprocessing.pool
 
 if __name__=="__main__":
     sys.path.append(os.path.dirname(os.path.abspath(sys.argv[0])))
 
 from . import ProjectInvoke, DependencyGraph
+from . import BuildDurations
+from . import write_trace
 from . import ProjectMap
 from . import RepoSet
 from . import run_batch_command
+from . import JenkinsClient
+from . import TRANSPORT, TransportError
+from . import StatusWatcher
 
 triggered_builds = []
 
+# concurrent requests to the server, to trigger builds, poll builds
+# individually and read build status for the summary
+WORKER_THREADS = 16
+
+# seconds between polls of the server for build status
+POLL_INTERVAL = 15
+
+# seconds after a build ends before the server reports its final
+# status
+SETTLE_TIME = 10
+
+# seconds between reads of the page of a build that wrote its status,
+# until the server reports the final result
+PROMPT_INTERVAL = 1
+
 def abort_builds(ignore, _):
     jen = Jenkins(None, None)
     print "Aborting builds"
@@ -117,25 +137,63 @@ class Jenkins:
         self._result_path = result_path
         self._time = str(time.time())
 
+        # for each job url, an index of recent builds by hash, with the
+        # highest build number and the time the index was refreshed
+        self._build_index = {}
+
+        self._client = JenkinsClient()
+
+        # status files of the triggered builds
+        self._watcher = StatusWatcher()
+
+        # use the current build_support branch on the component builds
+        r = git.Repo(ProjectMap().source_root())
+        self._build_support_sha = r.commit().hexsha
+
+        # first time a result was seen for builds without an end_time
+        self._settling = {}
+
+        # invoke strings of builds whose final status was read from
+        # the server
+        self._confirmed = set()
+
+        # invoke string -> time to read the result of a build from the
+        # server, for builds which wrote their status to the info file
+        self._prompted = {}
+
+        # completed builds not yet returned by wait_for_build
+        self._finished = []
+
+        # worker threads for concurrent requests.  The pool lasts as
+        # long as the scheduler, so each thread keeps its connection
+        # to the server alive from one round to the next.
+        self._pool = None
+
+    def concurrent_map(self, func, items):
+        """applies func to items on the worker threads"""
+        if not items:
+            return []
+        if not self._pool:
+            self._pool = multiprocessing.pool.ThreadPool(WORKER_THREADS)
+        return self._pool.map(func, items)
+
+    def close(self):
+        """stops the worker threads"""
+        if self._pool:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
     def job_url(self, invoke):
         if "win" in invoke.options.hardware:
             return "http://" + self._server + "/job/WinLeeroy"
         return "http://" + self._server + "/job/Leeroy"
 
-    # this function is common to jenkins.py
     def _reliable_url_open(self, url):
-        # We use a loop to open the url because of DE3123
-        failcount = 0
-        while True:
-            try:
-                f = urllib2.urlopen(url)
-                return f
-            except (urllib2.HTTPError, urllib2.URLError):
-                print "failure urllib2.urlopen(\"{0}\")".format(url)
-                failcount += 1
-                if failcount == 5:
-                    raise
-                time.sleep(5)
+        # the transport retries failed requests because of DE3123.
+        # Triggers wait out server outages rather than failing the
+        # run, and are not repeated if the server may have seen them.
+        return TRANSPORT.request(url, idempotent=False, wait=True)
 
     def write_failure_log(self, project_invoke):
         log_dir = self._result_path + "/test/logs"
@@ -159,17 +217,15 @@ class Jenkins:
                         # a build was cancelled in the queue
                         print "build was triggered but never built: " + str(trigger_time)
                         live_build = False
-            try:
-                f = urllib2.urlopen(job_url + "/api/python")
-                abuild_page = ast.literal_eval(f.read())
-                if abuild_page["result"]:
-                    # there is a build result, probably cancelled
-                    print "found dead build with status: " + abuild_page["result"]
-                    print "url: " + job_url
-                    print "rebuilding."
-                    live_build = False
-            except:
-                pass
+            abuild_page = None
+            if job_url:
+                abuild_page = self._client.get(job_url, "result")
+            if abuild_page and abuild_page["result"]:
+                # there is a build result, probably cancelled
+                print "found dead build with status: " + abuild_page["result"]
+                print "url: " + job_url
+                print "rebuilding."
+                live_build = False
             if live_build:
                 raise BuildInProgress(project_invoke, self._revspec)
             # else the build is dead, we should rebuild it.
@@ -181,22 +237,33 @@ class Jenkins:
 
         project_invoke.set_info("status", "building")
         project_invoke.set_info("url", "")
+        project_invoke.set_info("queue_url", "")
         self._jobs.append(project_invoke)
+        self._watcher.watch(project_invoke.info_file())
 
-        # use the current build_support branch on the component builds
-        r = git.Repo(ProjectMap().source_root())
-        bs_branch = r.commit().hexsha
         url = "{0}/buildWithParameters?token=noauth&{1}&branch={2}&build_support_branch={3}".format(
             self.job_url(project_invoke),
             self._jenkins_params(project_invoke),
             branch,
-            bs_branch
+            self._build_support_sha
         )
         if extra_arg:
             url = url + "&extra_arg=" + urllib2.quote(extra_arg)
 
-        f = self._reliable_url_open(url)
+        try:
+            f = self._reliable_url_open(url)
+        except TransportError:
+            # the build was not triggered, so it is not left building
+            self._jobs.remove(project_invoke)
+            self._watcher.unwatch(project_invoke.info_file())
+            project_invoke.set_info("status", status or "")
+            raise
         f.read()
+        # jenkins responds with the location of the queue item, which
+        # identifies the build once it leaves the queue.
+        queue_url = f.getheader("Location")
+        if queue_url:
+            project_invoke.set_info("queue_url", queue_url)
         return True
 
     def reboot_builder(self, builder):
@@ -219,9 +286,8 @@ class Jenkins:
         build_link = build_link + "stop/"
 
         try:
-            f = urllib2.urlopen(build_link, data=data)
-            f.read()
-        except (urllib2.HTTPError, urllib2.URLError):
+            TRANSPORT.request(build_link, data=data, retries=0, wait=True)
+        except TransportError:
             # stopping build on abort typically fails for at least one build
             pass
         project_invoke.set_info("status", "aborted")
@@ -261,129 +327,238 @@ class Jenkins:
                 job_url = "enqueued"
             print "\t" + a_job.to_short_string() + " : " + job_url
 
-    def wait_for_build(self):
-        if not self._jobs:
+    def _build_page(self, job_url):
+        """current status of a build, or None if it can't be read"""
+        return self._client.get(job_url, self.BUILD_TREE)
+
+    def _poll_builds(self):
+        """reads the status page of each triggered build.  Returns a
+        list of (invoke, build page) for the builds that were found."""
+        # one query for each job url reads the newest builds of every
+        # invoke that is running.
+        fresh = {}
+        for job_url in set([self.job_url(j) for j in self._jobs]):
+            for abuild in self._refresh_index(job_url) or []:
+                fresh[self._build_hash(abuild)] = abuild
+
+        polled = []
+        unlisted = []
+        for a_job in self._jobs:
+            abuild_page = fresh.get(a_job.hash(self._time))
+            if abuild_page:
+                polled.append((a_job, abuild_page))
+            else:
+                unlisted.append(a_job)
+        if not unlisted:
+            return polled
+
+        # older builds and builds still in the queue are read
+        # individually, in parallel.
+        polled += self.concurrent_map(self._poll_build, unlisted)
+        return [(a_job, page) for (a_job, page) in polled if page]
+
+    def _poll_build(self, a_job):
+        """(invoke, build page) for a single triggered build"""
+        job_url = a_job.get_info("url", block=False)
+        if job_url:
+            return (a_job, self._build_page(job_url))
+        return (a_job, self.get_matching_build(a_job))
+
+    def _finished_by_status(self, changed):
+        """builds that wrote a status to their info file, and whose
+        result the server has confirmed.  The status file only prompts
+        an early read of the build page, as the server sets results
+        like unstable after the component completes."""
+        now = time.time()
+        for a_job in self._jobs:
+            if a_job.info_file() not in changed or str(a_job) in self._prompted:
+                continue
+            if not a_job.get_info("status", block=False):
+                continue
+            end_time = a_job.get_info("end_time", block=False)
+            trigger_time = a_job.get_info("trigger_time", block=False)
+            if not end_time or (trigger_time and end_time < trigger_time):
+                # status from a previous build of the component
+                continue
+            self._prompted[str(a_job)] = now
+
+        due = [a_job for a_job in self._jobs
+               if self._prompted.get(str(a_job), now + 1) <= now]
+        finished = []
+        for (a_job, abuild_page) in self.concurrent_map(self._poll_build, due):
+            status = abuild_page and self._completed(a_job, abuild_page)
+            if status:
+                finished.append(status)
+            else:
+                # not yet complete on the server
+                self._prompted[str(a_job)] = time.time() + PROMPT_INTERVAL
+        return finished
+
+    def _next_prompt(self):
+        """time of the next read of a build that wrote its status"""
+        if not self._prompted:
+            return None
+        return min(self._prompted.values())
+
+    def _completed(self, a_job, abuild_page):
+        """finishes a build if the server reports its final result.
+        Returns the BuildStatus of the build, or None if it is not
+        complete."""
+        if not a_job.get_info("url", block=False):
+            # cache the url in the build_info, so we don't
+            # have to keep searching for it.
+            a_job.set_info("url", abuild_page["url"])
+            print abuild_page["url"] + " found for " + a_job.to_short_string()
+
+        if not abuild_page["result"]:
+            # build not complete yet
             return None
 
-        # iterate _jobs, searching for matching job on jenkins.
-        # Return any job that is complete.  Raise error if matching
-        # job failure.
-        first_round = True
+        # build will temporarily report success until warnings
+        # and test results are parsed.  This takes just a few
+        # seconds, during which the server reports the build as still
+        # building.  Where it doesn't, wait for a later round to read
+        # the final status, if the build finished less than
+        # SETTLE_TIME seconds ago.
+        hash_str = a_job.hash(self._time)
+        if abuild_page.get("building") is not False:
+            end_time = a_job.get_info("end_time", block=False)
+            if not end_time:
+                end_time = self._settling.setdefault(hash_str, time.time())
+            if time.time() - end_time < SETTLE_TIME:
+                return None
+        self._settling.pop(hash_str, None)
+
+        self._finish(a_job)
+        self._confirmed.add(str(a_job))
+        return BuildStatus(a_job, abuild_page["url"],
+                           abuild_page["result"].lower())
+
+    def _finished_on_server(self):
+        """builds that the server reports as complete"""
+        finished = []
+        for (a_job, abuild_page) in self._poll_builds():
+            status = self._completed(a_job, abuild_page)
+            if status:
+                finished.append(status)
+        return finished
+
+    def _finish(self, a_job):
+        a_job.set_info("collect_time", time.time())
+        self._jobs.remove(a_job)
+        self._watcher.unwatch(a_job.info_file())
+        self._prompted.pop(str(a_job), None)
+
+    def wait_for_builds(self):
+        """blocks until at least one triggered build is complete.
+        Returns a BuildStatus for each build that completed."""
+        if not self._jobs:
+            return []
+
+        # components write their status as soon as they complete,
+        # which is the primary signal that a build is done.  The build
+        # page is then read for the final result.  All builds are
+        # polled less often, for builds that can't write to the result
+        # path.
+        changed = self._watcher.changed()
+        next_poll = 0
         while True:
-            # moderate the rate of polling, but do not add any latency
-            # to the first attempt to find a finished build.
-            if not first_round:
-                time.sleep(5)
-            first_round = False
-
-            for i in range(len(self._jobs)):
-                a_job = self._jobs[i]
-                # get the url from the build_info file, if possible
-                job_url = a_job.get_info("url")
-
-                abuild_page = None
-                if not job_url:
-                    abuild_page = self.get_matching_build(a_job)
-                    if not abuild_page:
-                        # job not yet scheduled
-                        continue
-                    # cache the url in the build_info, so we don't
-                    # have to keep searching for it.
-                    job_url = abuild_page["url"]
-                    a_job.set_info("url", job_url)
-                    print job_url + " found for " + a_job.to_short_string()
-
-                if not abuild_page:
-                    try:
-                        f = urllib2.urlopen(job_url + "/api/python")
-                    except:
-                        continue
-                    abuild_page = ast.literal_eval(f.read())
-
-                if not abuild_page["result"]:
-                    # build not complete yet
-                    continue
-
-                end_time = a_job.get_info("end_time")
-                
-                if not end_time or (time.time() - end_time < 10):
-                    # build will temporarily report success until
-                    # warnings and test results are parsed.  This
-                    # takes just a few seconds.  Re-read the status
-                    # page to ensure we have the final status.  Only
-                    # incur delays if the build finished less than 10
-                    # seconds ago.
-                    time.sleep(10 )
-                try:
-                    f = urllib2.urlopen(job_url + "/api/python")
-                except:
-                    continue
-                abuild_page = ast.literal_eval(f.read())
-
-                a_job.set_info("collect_time", time.time())
-                if (abuild_page["result"] == "SUCCESS" or 
-                    abuild_page["result"] == "UNSTABLE"):
-
-                    return BuildStatus(self._jobs.pop(i), 
-                                       abuild_page["url"], 
-                                       abuild_page["result"].lower())
-                self._jobs.pop(i)
-                raise BuildFailure(a_job, abuild_page["url"])
+            finished = self._finished_by_status(changed)
+            if time.time() >= next_poll:
+                next_poll = time.time() + POLL_INTERVAL
+                finished += self._finished_on_server()
+            if finished:
+                return finished
+            wake = min(filter(None, [next_poll, self._next_prompt()]))
+            changed = self._watcher.wait(max(0, wake - time.time()))
 
-    def get_matching_build(self, project_invoke):
-        job_url = self.job_url(project_invoke)
-        f = None
-        try:
-            f = urllib2.urlopen(job_url + "/api/python")
-        except:
+    def wait_for_build(self):
+        """returns the next complete build.  Raise error if the build
+        failed."""
+        if not self._finished:
+            self._finished = self.wait_for_builds()
+        if not self._finished:
             return None
-
-        job_page = ast.literal_eval(f.read())
-        max_job = job_page["nextBuildNumber"]
-        # check last 100 builds
-        for abuild_number in range(max_job-1, max_job - 401, -1):
-            try:
-                f = urllib2.urlopen(job_url + "/" + 
-                                    str(abuild_number) + "/api/python")
-            except:
-                continue
-            abuild_page = ast.literal_eval(f.read())
-            if not self.match_project_invoke(project_invoke, abuild_page):
-                # not the matching build for the job that we are looking for
-                continue
-            return abuild_page
-
-        # see if there are newer builds that haven't shown up in the history
+        finished = self._finished.pop(0)
+        if finished.status in ("success", "unstable"):
+            return finished
+        raise BuildFailure(finished.invoke, finished.url)
+
+    # fields of builds needed to identify them
+    BUILD_TREE = "number,url,result,building,actions[parameters[name,value]]"
+
+    def _queued_build(self, queue_url):
+        """build page for a triggered build, from its queue item"""
+        # queue items expire a few minutes after the build starts
+        item = self._client.get(queue_url, "executable[url]")
+        if not item or not item.get("executable"):
+            return None
+        return self._client.get(item["executable"]["url"], self.BUILD_TREE)
+
+    def _refresh_index(self, job_url):
+        """adds recent builds of the job to the index, and returns them.
+        Only the newest builds are fetched, unless builds may have been
+        missed since the last refresh."""
+        (index, last_number, _) = self._build_index.get(job_url, ({}, 0, 0))
+        count = 50
+        if not last_number:
+            count = 400
         while True:
-            try:
-                max_job += 1
-                url = job_url + "/" + str(max_job) + "/api/python"
-                f = urllib2.urlopen(url)
-                abuild_page = ast.literal_eval(f.read())
-                if self.match_project_invoke(project_invoke, abuild_page):
-                    return abuild_page
-            except:
-                # got a 404, build doesn't exist
-                return None
-                
+            tree = "builds[{0}]{{0,{1}}}".format(self.BUILD_TREE, count)
+            job_page = self._client.get(job_url, tree)
+            if not job_page:
+                return
+            builds = job_page.get("builds", [])
+            numbers = [b["number"] for b in builds]
+            if (count < 400 and last_number and numbers and
+                min(numbers) > last_number + 1):
+                # more builds were started than were fetched
+                count = 400
+                continue
+            break
+        for abuild in builds:
+            hash_str = self._build_hash(abuild)
+            if hash_str:
+                index[hash_str] = abuild
+        if numbers:
+            last_number = max(numbers + [last_number])
+        self._build_index[job_url] = (index, last_number, time.time())
+        return builds
 
-    def match_project_invoke(self, project_invoke, build_dict):
-        """true if the dict matches the invoke"""
+    def get_matching_build(self, project_invoke):
+        hash_str = project_invoke.hash(self._time)
+        queue_url = project_invoke.get_info("queue_url", block=False)
+        if queue_url:
+            abuild_page = self._queued_build(queue_url)
+            if abuild_page and self._build_hash(abuild_page) == hash_str:
+                return abuild_page
 
-        # get build_params
+        job_url = self.job_url(project_invoke)
+        (index, _, refresh_time) = self._build_index.get(job_url, ({}, 0, 0))
+        if hash_str not in index and time.time() - refresh_time > 2:
+            # at most one request per job url for each polling round
+            self._refresh_index(job_url)
+            index = self._build_index.get(job_url, ({}, 0, 0))[0]
+        return index.get(hash_str)
+
+    def _build_hash(self, build_dict):
+        """the hash parameter of the build"""
         build_params = []
-        for an_action in build_dict["actions"]:
-            if an_action.has_key("parameters"):
+        for an_action in build_dict.get("actions", []):
+            if an_action and an_action.has_key("parameters"):
                 build_params = an_action["parameters"]
                 break
-        if not build_params:
-            print "WARN: build without params when searching for: " + project_invoke.to_short_string()
-            return False
-        hash_str = ""
         for a_param in build_params:
             if a_param["name"] == "hash":
-                hash_str = a_param["value"]
-                break
+                return a_param["value"]
+        return None
+
+    def match_project_invoke(self, project_invoke, build_dict):
+        """true if the dict matches the invoke"""
+        hash_str = self._build_hash(build_dict)
+        if hash_str is None:
+            print "WARN: build without params when searching for: " + project_invoke.to_short_string()
+            return False
         return hash_str == project_invoke.hash(self._time)
 
     def get_build_link(self, project_invoke, block=True):
@@ -402,11 +577,19 @@ class Jenkins:
             time.sleep(1)
 
     def build_all(self, depGraph, branch="mesa_master", print_summary=True):
+        try:
+            return self._build_all(depGraph, branch, print_summary)
+        finally:
+            self.close()
+
+    def _build_all(self, depGraph, branch, print_summary):
         signal.signal(signal.SIGINT, abort_builds)
         signal.signal(signal.SIGABRT, abort_builds)
         signal.signal(signal.SIGTERM, abort_builds)
 
         triggered_builds = []
+        durations = BuildDurations()
+        depGraph.prioritize(durations)
         ready_for_build = depGraph.ready_builds()
         assert(ready_for_build)
         build_type = ready_for_build[0].options.type
@@ -414,13 +597,22 @@ class Jenkins:
         failure_builds = []
         success = True
         pm = ProjectMap()
-        summary_xml = pm.source_root() + "/summary.xml"
-        if os.path.exists(summary_xml):
-            os.remove(summary_xml)
+        for a_file in ["summary.xml", "trace.json", "http_metrics.json"]:
+            if os.path.exists(pm.source_root() + "/" + a_file):
+                os.remove(pm.source_root() + "/" + a_file)
+
+        def trigger(an_invoke):
+            try:
+                self.build(an_invoke, branch=branch)
+            except(BuildInProgress) as e:
+                return e
+            an_invoke.set_info("trigger_time", time.time())
+            return None
 
         while success:
             self.print_builds()
             builds_in_round = 0
+            to_trigger = []
             for an_invoke in ready_for_build:
                 status = an_invoke.get_info("status", block=False)
 
@@ -440,15 +632,19 @@ class Jenkins:
                     builds_in_round += 1
                     continue
 
-                try:
-                    print "Starting: " + an_invoke.to_short_string()
-                    self.build(an_invoke, branch=branch)
-                    an_invoke.set_info("trigger_time", time.time())
-                    triggered_builds.append(an_invoke)
-                except(BuildInProgress) as e:
-                    print e
-                    success = False
-                    break
+                print "Starting: " + an_invoke.to_short_string()
+                to_trigger.append(an_invoke)
+
+            if to_trigger:
+                # each trigger reads and writes the status file and
+                # waits on the server, so they are sent concurrently.
+                in_progress = self.concurrent_map(trigger, to_trigger)
+                for (an_invoke, e) in zip(to_trigger, in_progress):
+                    if e:
+                        print e
+                        success = False
+                    else:
+                        triggered_builds.append(an_invoke)
 
             if not success:
                 break
@@ -457,27 +653,27 @@ class Jenkins:
                 ready_for_build = depGraph.ready_builds(triggered_builds)
                 continue
 
-            finished = None
-            try:
-                finished = self.wait_for_build()
-                if finished:
-                    builds_in_round += 1
-            except(BuildFailure) as failure:
-                failure.invoke.set_info("status", "failure")
-                print "Build failure: " + failure.url
-                print "Build failure: " + str(failure.invoke)
-                self.write_failure_log(failure.invoke)
-                failure_builds.append(failure.invoke)
-                builds_in_round += 1
-
-            if finished:
+            finished_builds = self.wait_for_builds()
+            for finished in finished_builds:
+                if finished.status not in ("success", "unstable"):
+                    finished.invoke.set_info("status", "failure")
+                    print "Build failure: " + finished.url
+                    print "Build failure: " + str(finished.invoke)
+                    self.write_failure_log(finished.invoke)
+                    failure_builds.append(finished.invoke)
+                    continue
                 finished.invoke.set_info("status", finished.status)
+                trigger_time = finished.invoke.get_info("trigger_time",
+                                                        block=False)
+                if trigger_time:
+                    durations.record(finished.invoke,
+                                     time.time() - float(trigger_time))
                 print "Build finished: " + finished.invoke.to_short_string() + " " + finished.url
 
                 completed_builds.append(finished.invoke)
                 depGraph.build_complete(finished.invoke)
 
-            elif not builds_in_round:
+            if not finished_builds and not builds_in_round:
                 # nothing was built, there was no failure, and no
                 # builds are ready => the last project is built
 
@@ -486,7 +682,12 @@ class Jenkins:
                 if print_summary:
                     write_summary(pm.source_root(), 
                                   failure_builds + completed_builds, 
-                                  self)
+                                  self, depGraph=depGraph)
+                TRANSPORT.write_metrics(pm.source_root() + "/http_metrics.json")
+                metrics = TRANSPORT.metrics()
+                print ("HTTP requests: {requests} retries: {retries} "
+                       "failures: {failures} mean latency: "
+                       "{latency_mean:.3f}s".format(**metrics))
                 if failure_builds:
                     raise BuildFailure(failure_builds[0], "")
 
@@ -515,7 +716,7 @@ def generate_color_key(ljen):
     out_key += r'</tr></table>'
     return out_key
 
-def generate_summary_row(build, ljen, header=False):
+def generate_summary_row(build, ljen, header=False, info=None):
     if header:
         options_dict = {}
         bg_color = '#C6E2FF'
@@ -523,14 +724,16 @@ def generate_summary_row(build, ljen, header=False):
         link = ''
     else:
         font_attr = 'normal'
-        bg_color = ljen.status_colors.get(build.get_info("status"), 
+        if info is None:
+            info = build.info()
+        bg_color = ljen.status_colors.get(info.get("status"), 
                                           ljen.status_colors['unknown'])
         options_dict = vars(build.options)
-        link = ljen.get_build_link(build, block=False)
+        link = info.get("url") or ljen.get_build_link(build, block=False)
         options_dict['project'] = build.project
         #options_dict['platform'] = build.platform
-        duration = hours_minutes_seconds(build.get_info("collect_time"), 
-                                         build.get_info("trigger_time"))
+        duration = hours_minutes_seconds(info.get("collect_time"), 
+                                         info.get("trigger_time"))
         options_dict['duration'] = duration
                                    
         if not link:
@@ -562,18 +765,16 @@ def hours_minutes_seconds(finish_time, start_time):
 
 def refresh_status(build):
     build_page = None
-    url = build.get_info("url")
+    url = build.get_info("url", block=False)
     if not url:
         return
+    client = JenkinsClient()
     for _ in range(0,10):
-        try:
-            f = urllib2.urlopen(url + "/api/python")
-            build_page = ast.literal_eval(f.read())
+        build_page = client.get(url, "result")
+        if build_page:
             break
-        except:
-            print "Retrying read of build page: " + url
-            time.sleep(1)
-            continue
+        print "Retrying read of build page: " + url
+        time.sleep(1)
 
     if not build_page:
         return
@@ -581,13 +782,30 @@ def refresh_status(build):
         return
     build.set_info("status",  build_page["result"].lower())
 
-def write_summary(out_dir, completed_builds, ljen, failure=False):
+def summary_info(builds, ljen):
+    """dict of invoke string -> status content of each build.  Builds
+    are read concurrently, and the status of builds which were not
+    collected from the server is refreshed first."""
+    def read(build):
+        if str(build) not in ljen._confirmed:
+            refresh_status(build)
+        return (str(build), build.info())
+    return dict(ljen.concurrent_map(read, builds))
+
+def write_summary(out_dir, completed_builds, ljen, failure=False,
+                  depGraph=None):
     if completed_builds and type(completed_builds[0]) == type(""):
         # we have been passed a list of invoke strings instead of
         # objects.  Convert them
         invoke_builds = [ProjectInvoke(from_string=buildstr) for buildstr in completed_builds]
         completed_builds = invoke_builds
     repo_set = RepoSet()
+    infos = summary_info(completed_builds, ljen)
+    graph = None
+    if depGraph:
+        graph = depGraph._full_graph
+    write_trace(os.path.join(out_dir, "trace.json"), completed_builds,
+                infos, graph)
 
     git_log = {}
     for project in ljen._revspec._revisions:
@@ -619,8 +837,7 @@ def write_summary(out_dir, completed_builds, ljen, failure=False):
     <table sorttable="yes">""")
     outf.write(generate_summary_row(None, ljen, header=True))
     for build in completed_builds:
-        refresh_status(build)
-        outf.write(generate_summary_row(build, ljen))
+        outf.write(generate_summary_row(build, ljen, info=infos[str(build)]))
     outf.write("""\
     </table>
     <br />""")
@@ -645,18 +862,23 @@ def write_summary(out_dir, completed_builds, ljen, failure=False):
                                         color="#C6E2FF",
                                         url=""))
 
-    long_pole_builds = DependencyGraph.long_pole(completed_builds[-1])
+    end_times = dict([(k, v.get("end_time")) for (k, v) in infos.items()])
+    long_pole_builds = DependencyGraph.long_pole(completed_builds[-1],
+                                                 depGraph, end_times)
     long_pole_builds.reverse()
     for a_build in long_pole_builds:
-        link = ljen.get_build_link(a_build, block=False)
-        duration=hours_minutes_seconds(a_build.get_info("collect_time"), 
-                                       a_build.get_info("trigger_time"))
-        waiting = hours_minutes_seconds(a_build.get_info("start_time"), 
-                                        a_build.get_info("trigger_time"))
-        building = hours_minutes_seconds(a_build.get_info("end_time"), 
-                                         a_build.get_info("start_time"))
-        finishing = hours_minutes_seconds(a_build.get_info("collect_time"), 
-                                          a_build.get_info("end_time"))
+        info = infos.get(str(a_build))
+        if info is None:
+            info = a_build.info()
+        link = info.get("url") or ljen.get_build_link(a_build, block=False)
+        duration=hours_minutes_seconds(info.get("collect_time"), 
+                                       info.get("trigger_time"))
+        waiting = hours_minutes_seconds(info.get("start_time"), 
+                                        info.get("trigger_time"))
+        building = hours_minutes_seconds(info.get("end_time"), 
+                                         info.get("start_time"))
+        finishing = hours_minutes_seconds(info.get("collect_time"), 
+                                          info.get("end_time"))
         outf.write(long_pole_row_txt.format(project=a_build.project, 
                                             duration=duration, 
                                             waiting=waiting, 
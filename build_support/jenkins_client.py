@@ -0,0 +1,210 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+import BaseHTTPServer
+import SocketServer
+import json
+import re
+import socket
+import sys
+import threading
+import urllib
+import urlparse
+
+from . import TRANSPORT, TransportError
+
+class JenkinsClient:
+    """Reads pages from the json api of the CI server.  Callers name the
+    fields they need with a tree filter, so large build pages are not
+    transferred and parsed in full."""
+    def __init__(self, timeout=30, transport=None):
+        self._timeout = timeout
+        self._transport = transport or TRANSPORT
+
+    def get(self, url, tree=None):
+        """the api page for url, filtered by tree.  Returns None if the
+        page can't be read."""
+        api_url = url.rstrip("/") + "/api/json"
+        if tree:
+            api_url += "?tree=" + urllib.quote(tree, safe="")
+        try:
+            # callers poll, so a failed read is retried only once
+            f = self._transport.request(api_url, retries=1,
+                                        timeout=self._timeout)
+            return json.loads(f.read())
+        except (TransportError, ValueError):
+            return None
+
+def _parse_tree(tree, pos=0):
+    """parses a tree filter (eg "builds[number,url]{0,50}") into a dict
+    of field name -> (sub-tree, range).  Returns the dict and the
+    position following the parsed fields."""
+    fields = {}
+    while pos < len(tree):
+        name = re.match(r"[^,\[\]{}]*", tree[pos:]).group(0)
+        pos += len(name)
+        subtree = None
+        page_range = None
+        if pos < len(tree) and tree[pos] == "[":
+            (subtree, pos) = _parse_tree(tree, pos + 1)
+            # skip the closing bracket
+            pos += 1
+        if pos < len(tree) and tree[pos] == "{":
+            end = tree.index("}", pos)
+            page_range = tree[pos + 1:end]
+            pos = end + 1
+        fields[name] = (subtree, page_range)
+        if pos < len(tree) and tree[pos] == ",":
+            pos += 1
+            continue
+        break
+    return (fields, pos)
+
+def _range_slice(page_range):
+    """slice for a jenkins range: {M,N}, {M,}, {,N} or {N}"""
+    if "," not in page_range:
+        return slice(int(page_range), int(page_range) + 1)
+    (start, end) = page_range.split(",")
+    return slice(int(start) if start else None, int(end) if end else None)
+
+def _filter_tree(page, fields):
+    """the parts of the page that are selected by the parsed tree"""
+    if fields is None:
+        return page
+    if type(page) == list:
+        return [_filter_tree(item, fields) for item in page]
+    if type(page) != dict:
+        return page
+    filtered = {}
+    for (name, (subtree, page_range)) in fields.items():
+        if name not in page:
+            continue
+        value = page[name]
+        if page_range and type(value) == list:
+            value = value[_range_slice(page_range)]
+        filtered[name] = _filter_tree(value, subtree)
+    return filtered
+
+class _StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # keep connections open between requests, as jenkins does
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        stand_in = self.server.stand_in
+        stand_in.requests.append(self.path)
+        url = urlparse.urlparse(self.path)
+        (code, headers, body) = stand_in.respond(url.path,
+                                                 urlparse.parse_qs(url.query))
+        self.send_response(code)
+        for (header, value) in headers.items():
+            self.send_header(header, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class _StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    # each persistent connection is served by its own thread
+    daemon_threads = True
+
+    def __init__(self, address, handler):
+        BaseHTTPServer.HTTPServer.__init__(self, address, handler)
+        self._lock = threading.Lock()
+        # open connection -> the thread serving it
+        self._connections = {}
+
+    def process_request(self, request, client_address):
+        t = threading.Thread(target=self.process_request_thread,
+                             args=(request, client_address))
+        t.daemon = self.daemon_threads
+        with self._lock:
+            self._connections[request] = t
+        t.start()
+
+    def shutdown_request(self, request):
+        with self._lock:
+            self._connections.pop(request, None)
+        BaseHTTPServer.HTTPServer.shutdown_request(self, request)
+
+    def handle_error(self, request, client_address):
+        # clients may drop their persistent connections at any time
+        if isinstance(sys.exc_info()[1], socket.error):
+            return
+        BaseHTTPServer.HTTPServer.handle_error(self, request, client_address)
+
+    def close_connections(self):
+        """ends persistent connections, and waits for their threads"""
+        with self._lock:
+            connections = self._connections.items()
+        for (request, _) in connections:
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        for (_, t) in connections:
+            t.join()
+
+class StandInJenkins:
+    """Serves api pages on a local port, in place of the CI server.
+    Pages are json-compatible dicts keyed by path, eg
+    "/job/Leeroy/12".  Tree filters are applied as jenkins would."""
+    def __init__(self, pages=None):
+        self.pages = pages or {}
+        # paths of all requests, for tests to inspect
+        self.requests = []
+        self._server = _StandInServer(("127.0.0.1", 0), _StandInHandler)
+        self._server.stand_in = self
+        self.host = "127.0.0.1:" + str(self._server.server_port)
+        self.url = "http://" + self.host
+        self._thread = None
+
+    def respond(self, path, query):
+        """(status code, headers, body) for a GET request.  query is a
+        dict of parameter -> list of values."""
+        if path.endswith("/api/json"):
+            path = path[:-len("/api/json")]
+        page = self.pages.get(path.rstrip("/"))
+        if page is None:
+            return (404, {}, "")
+        tree = query.get("tree")
+        if tree:
+            page = _filter_tree(page, _parse_tree(tree[0])[0])
+        return (200, {"Content-Type" : "application/json"}, json.dumps(page))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._thread.join()
+        self._server.close_connections()
+        self._server.server_close()
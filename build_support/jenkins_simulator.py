@@ -0,0 +1,201 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from . import StandInJenkins
+
+class SimulatedJenkins(StandInJenkins):
+    """A local build master, for exercising the scheduler without a CI
+    server.  Builds triggered through buildWithParameters wait in the
+    queue for queue_delay seconds and for a free executor.  Then they
+    run for duration seconds and fail at failure_rate.  duration is a
+    number, or a function of the dict of build parameters.
+
+    As the component builds would, completed builds write their status
+    to the _build_info file under the result_path parameter."""
+    def __init__(self, duration=1.0, failure_rate=0.0, queue_delay=0.0,
+                 executors=None, write_status=True, seed=0):
+        StandInJenkins.__init__(self)
+        self._duration = duration
+        if not callable(duration):
+            self._duration = lambda params: duration
+        self._failure_rate = failure_rate
+        self._queue_delay = queue_delay
+        self._executors = executors
+        self._write_status = write_status
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        # queue items and builds, in the order they were triggered
+        self._queue = []
+        self._running = []
+        self._next_item = 1
+        self._next_number = {}
+        # idle executors.  Without a limit, executors are added when
+        # none are idle.
+        self._free = range(executors or 0)
+        self._executor_count = executors or 0
+
+        self._stopped = threading.Event()
+        self._ticker = None
+
+    def respond(self, path, query):
+        with self._lock:
+            if path.endswith("/buildWithParameters"):
+                return self._trigger(path[:-len("/buildWithParameters")],
+                                     query)
+            return StandInJenkins.respond(self, path, query)
+
+    def _trigger(self, job, query):
+        params = dict([(k, v[0]) for (k, v) in query.items()])
+        item = self._next_item
+        self._next_item += 1
+        self.pages["/queue/item/" + str(item)] = {"id" : item}
+        self._queue.append({"item" : item,
+                            "job" : job,
+                            "params" : params,
+                            "time" : time.time()})
+        if job not in self.pages:
+            self.pages[job] = {"builds" : []}
+        location = self.url + "/queue/item/" + str(item) + "/"
+        return (201, {"Location" : location}, "")
+
+    def _info_file(self, params):
+        if not params.get("result_path"):
+            return None
+        # matches ProjectInvoke.info_file, which compares the shard
+        # string with 0, and so always appends it.
+        shard_str = "_" + params.get("shard", "0")
+        return "/".join([params["result_path"],
+                         params.get("project", ""),
+                         params.get("arch", ""),
+                         params.get("config", ""),
+                         params.get("hardware", ""),
+                         "_build_info" + shard_str + ".txt"])
+
+    def _set_info(self, params, info):
+        info_file = self._info_file(params)
+        if not self._write_status or not info_file:
+            return
+        info_dict = {}
+        if os.path.exists(info_file):
+            info_dict = json.load(open(info_file))
+        else:
+            if not os.path.exists(os.path.dirname(info_file)):
+                os.makedirs(os.path.dirname(info_file))
+        info_dict.update(info)
+        (fd, tmp_file) = tempfile.mkstemp(dir=os.path.dirname(info_file),
+                                          suffix=".tmp")
+        os.write(fd, json.dumps(info_dict))
+        os.close(fd)
+        os.rename(tmp_file, info_file)
+
+    def advance(self):
+        """starts the queued builds that are ready, and completes the
+        builds that have run for their duration"""
+        with self._lock:
+            now = time.time()
+            for a_build in list(self._running):
+                if a_build["end"] > now:
+                    continue
+                self._running.remove(a_build)
+                self._free.append(a_build["executor"])
+                result = "SUCCESS"
+                if self._random.random() < self._failure_rate:
+                    result = "FAILURE"
+                a_build["page"]["result"] = result
+                a_build["page"]["building"] = False
+                info = {"end_time" : a_build["end"]}
+                if result == "SUCCESS":
+                    info["status"] = "success"
+                else:
+                    info["status"] = "failed"
+                self._set_info(a_build["params"], info)
+
+            for an_item in list(self._queue):
+                if an_item["time"] + self._queue_delay > now:
+                    continue
+                if self._executors and not self._free:
+                    break
+                self._queue.remove(an_item)
+                self._start(an_item, now)
+
+    def _start(self, an_item, now):
+        job = an_item["job"]
+        number = self._next_number.get(job, 1)
+        self._next_number[job] = number + 1
+        url = self.url + job + "/" + str(number) + "/"
+        params = an_item["params"]
+        page = {"number" : number,
+                "url" : url,
+                "result" : None,
+                "building" : True,
+                "actions" : [{"parameters" : [{"name" : k, "value" : v}
+                                              for (k, v)
+                                              in params.items()]}]}
+        self.pages[job + "/" + str(number)] = page
+        self.pages[job]["builds"].insert(0, page)
+        self.pages["/queue/item/" + str(an_item["item"])]["executable"] = {
+            "url" : url}
+
+        if self._free:
+            executor = self._free.pop(0)
+        else:
+            executor = self._executor_count
+            self._executor_count += 1
+        self._running.append({"page" : page,
+                              "params" : params,
+                              "executor" : executor,
+                              "end" : now + self._duration(params)})
+        self._set_info(params, {"start_time" : now,
+                                "host" : "executor-" + str(executor)})
+
+    def _tick(self):
+        while not self._stopped.wait(0.05):
+            self.advance()
+
+    def start(self):
+        StandInJenkins.start(self)
+        self._ticker = threading.Thread(target=self._tick)
+        self._ticker.daemon = True
+        self._ticker.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._ticker.join()
+        StandInJenkins.stop(self)
+
+    def triggered(self):
+        """number of builds that were triggered"""
+        return self._next_item - 1
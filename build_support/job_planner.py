@@ -0,0 +1,181 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+"""calculates build and test parallelism from the resources that are
+actually available to the current host or container"""
+import math
+import multiprocessing
+import os
+
+# approximate resident memory (MB) used by a single job.  Links are
+# much more expensive than compiles, and the m32 link of mesa is the
+# most expensive of all.
+COMPILE_JOB_MB = 512
+LINK_JOB_MB = {"m64": 1536,
+               "m32": 2048}
+TEST_JOB_MB = 256
+
+def _read_int(path):
+    try:
+        with open(path, "r") as fh:
+            return int(fh.read().split()[0])
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+
+class JobPlanner(object):
+    """Provides separate job counts for compiling, linking and testing.
+
+    The counts respect cgroup cpu quotas, the memory that is available
+    to the current cgroup, and the load that other processes are
+    already placing on the host.  Any of the measurements can be
+    overridden, which is primarily useful for testing."""
+
+    def __init__(self, arch="m64", cpus=None, mem_available=None, load=None,
+                 cgroup_root="/sys/fs/cgroup", meminfo="/proc/meminfo"):
+        self._arch = arch
+        self._cgroup_root = cgroup_root
+        self._meminfo = meminfo
+        self._cpus = cpus
+        if self._cpus is None:
+            self._cpus = self._available_cpus()
+        self._mem = mem_available
+        if self._mem is None:
+            self._mem = self._available_memory()
+        self._load = load
+        if self._load is None:
+            try:
+                self._load = os.getloadavg()[0]
+            except OSError:
+                self._load = 0.0
+
+    def _cpu_quota(self):
+        """number of cpus allowed by the cgroup, or None if unlimited"""
+        # cgroup v2
+        try:
+            with open(self._cgroup_root + "/cpu.max", "r") as fh:
+                quota, period = fh.read().split()[:2]
+            if quota != "max":
+                return float(quota) / float(period)
+            return None
+        except (IOError, OSError, ValueError):
+            pass
+        # cgroup v1
+        quota = _read_int(self._cgroup_root + "/cpu/cpu.cfs_quota_us")
+        period = _read_int(self._cgroup_root + "/cpu/cpu.cfs_period_us")
+        if quota and period and quota > 0:
+            return float(quota) / float(period)
+        return None
+
+    def _available_cpus(self):
+        cpus = multiprocessing.cpu_count()
+        quota = self._cpu_quota()
+        if quota:
+            cpus = min(cpus, int(math.ceil(quota)))
+        return max(cpus, 1)
+
+    def _available_memory(self):
+        """memory in MB that can be used without swapping, or None if it
+        can't be determined"""
+        mem = None
+        try:
+            fields = {}
+            with open(self._meminfo, "r") as fh:
+                for line in fh:
+                    tokens = line.split()
+                    fields[tokens[0].rstrip(":")] = int(tokens[1])
+            if "MemAvailable" in fields:
+                mem = fields["MemAvailable"] / 1024
+            else:
+                # older kernels
+                mem = (fields.get("MemFree", 0) +
+                       fields.get("Cached", 0)) / 1024
+        except (IOError, OSError, ValueError, IndexError):
+            pass
+
+        # a container may be limited to much less than the host has free
+        limit = _read_int(self._cgroup_root + "/memory.max")
+        usage = _read_int(self._cgroup_root + "/memory.current")
+        if limit is None:
+            limit = _read_int(self._cgroup_root + "/memory/memory.limit_in_bytes")
+            usage = _read_int(self._cgroup_root + "/memory/memory.usage_in_bytes")
+        # unlimited cgroups report an enormous limit
+        if limit is not None and limit < (1 << 50):
+            cgroup_mem = (limit - (usage or 0)) / (1024 * 1024)
+            if mem is None or cgroup_mem < mem:
+                mem = cgroup_mem
+        return mem
+
+    def _idle_cpus(self):
+        """cpus not already consumed by other processes on the host"""
+        busy = int(self._load) - self._cpus
+        if busy <= 0:
+            return self._cpus
+        return max(self._cpus - busy, 1)
+
+    def _memory_bound(self, job_mb):
+        if self._mem is None:
+            return None
+        return max(int(self._mem / job_mb), 1)
+
+    def compile_jobs(self):
+        jobs = self._idle_cpus() + 1
+        bound = self._memory_bound(COMPILE_JOB_MB)
+        if bound is not None:
+            jobs = min(jobs, bound)
+        return max(jobs, 1)
+
+    def _link_mb(self):
+        return LINK_JOB_MB.get(self._arch, LINK_JOB_MB["m32"])
+
+    def link_jobs(self):
+        jobs = self.compile_jobs()
+        bound = self._memory_bound(self._link_mb())
+        if bound is not None:
+            jobs = min(jobs, bound)
+        return max(jobs, 1)
+
+    def make_jobs(self):
+        """make can't limit links separately from compiles, so reserve
+        memory for one link and fill the rest with compiles"""
+        jobs = self.compile_jobs()
+        if self._mem is not None:
+            compiles = int((self._mem - self._link_mb()) / COMPILE_JOB_MB)
+            jobs = min(jobs, max(compiles, 0) + 1)
+        return max(jobs, 1)
+
+    def test_jobs(self):
+        jobs = self._idle_cpus()
+        bound = self._memory_bound(TEST_JOB_MB)
+        if bound is not None:
+            jobs = min(jobs, bound)
+        return max(jobs, 1)
+
+    def __str__(self):
+        return ("compile={0} link={1} test={2} (cpus={3}, mem={4}MB, "
+                "load={5:.1f})".format(self.compile_jobs(), self.link_jobs(),
+                                       self.test_jobs(), self._cpus, self._mem,
+                                       self._load))
@@ -33,6 +33,7 @@ import shutil
 import signal
 import subprocess
 import sys
+import tempfile
 import time
 import xml.etree.cElementTree as et
 
@@ -708,7 +709,15 @@ class ProjectInvoke:
                 # race condition means some other build may have
                 # created the directory.
                 pass
-        open(info_file, "w").write(json.dumps(info_dict))
+        if os.name == "nt":
+            open(info_file, "w").write(json.dumps(info_dict))
+            return
+        # replace the file, so the scheduler never reads a partial write
+        (fd, tmp_file) = tempfile.mkstemp(dir=info_dir, suffix=".tmp")
+        os.write(fd, json.dumps(info_dict))
+        os.close(fd)
+        os.chmod(tmp_file, 0o664)
+        os.rename(tmp_file, info_file)
 
     def get_info(self, key, block=True):
         for _ in range(0,10):
@@ -726,6 +735,10 @@ class ProjectInvoke:
         info_dict[key] = value
         self._write_info(info_dict)
 
+    def info(self):
+        """all status content of the build, from a single read"""
+        return self._read_info()
+
     def hash(self, salt):
         """provides a string value to uniquely identify a build.  This is used
         to find builds and resolve clashes between similar builds on
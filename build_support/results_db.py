@@ -0,0 +1,260 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+"""indexes collated junit results in a local sqlite database, so that
+the history of a test can be queried without parsing xml.  Only
+failures, and tests which passed only when retried, are stored for
+each test.  Passing tests are represented by the number of tests each
+build ran for a project and platform."""
+import os
+import sqlite3
+import time
+import xml.etree.cElementTree as et
+from . import is_test_file
+from . import test_class
+
+RESULTS_DB = os.path.expanduser("~/.cache/mesa_ci/results.db")
+
+# builds beyond the most recent are removed from the database
+RETAINED_BUILDS = 2000
+
+# incremented when the schema changes.  The database is a cache of
+# collated results, so older schemas are dropped rather than migrated.
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+create table if not exists builds (
+    id integer primary key,
+    result_path text,
+    revision text,
+    time real);
+create table if not exists runs (
+    build integer references builds(id) on delete cascade,
+    project text,
+    hardware text,
+    arch text,
+    tests integer,
+    failures integer);
+create table if not exists failures (
+    build integer references builds(id) on delete cascade,
+    project text,
+    test text,
+    hardware text,
+    arch text,
+    status text,
+    first_status text,
+    duration real,
+    pid text);
+create index if not exists runs_build on runs (build);
+create index if not exists failures_build on failures (build);
+create index if not exists failures_test on failures (test, hardware, arch);
+"""
+
+def testcase_status(tag):
+    """status of a junit testcase element: pass, fail, crash or skip"""
+    failure = tag.find("failure")
+    if failure is not None:
+        return failure.attrib.get("type", "crash")
+    if tag.find("error") is not None:
+        return "crash"
+    if tag.find("skipped") is not None:
+        return "skip"
+    status = tag.attrib.get("status", "pass").lower()
+    if status in ["skip", "notrun"]:
+        return "skip"
+    return "pass"
+
+class Ingest:
+    """collects the results of a build from junit testcase elements, eg
+    as they are parsed by TestLister"""
+    def __init__(self, db, result_path, revision):
+        self._db = db
+        self._result_path = result_path
+        self._revision = revision
+        self._failures = []
+        # (project, hardware, arch) to [tests, failures]
+        self._runs = {}
+        self.count = 0
+
+    def add_testcase(self, test_path, tag):
+        status = testcase_status(tag)
+        # set by test suites which retry flaky tests, when the retry
+        # replaced the status of the first attempt
+        first_status = tag.attrib.get("first_status")
+        try:
+            test = test_class(test_path)(full_test_name="unknown",
+                                         status="unknown",
+                                         test_tag=tag)
+        except (AttributeError, IndexError, KeyError, ValueError):
+            print "WARN: could not index test in " + test_path
+            return
+        self.count += 1
+        run = self._runs.setdefault((test.project, test.hardware, test.arch),
+                                    [0, 0])
+        run[0] += 1
+        if status in ["pass", "skip"]:
+            if first_status not in ["fail", "crash"]:
+                return
+        else:
+            run[1] += 1
+        self._failures.append((test.project, test.test_name, test.hardware,
+                               test.arch, status, first_status,
+                               float(tag.attrib.get("time", 0) or 0),
+                               test.pid))
+
+    def commit(self):
+        """adds the results as a new attempt of the result path.  Returns
+        the number of results."""
+        db = self._db
+        with db:
+            cursor = db.execute(
+                "insert into builds (result_path, revision, time) values (?, ?, ?)",
+                (self._result_path, self._revision, time.time()))
+            build = cursor.lastrowid
+            db.executemany("insert into runs values (?, ?, ?, ?, ?, ?)",
+                           [(build,) + k + tuple(v)
+                            for (k, v) in self._runs.items()])
+            db.executemany(
+                "insert into failures values (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(build,) + f for f in self._failures])
+            db.execute("delete from builds where id not in "
+                       "(select id from builds order by time desc, id desc "
+                       "limit ?)", (RETAINED_BUILDS,))
+        return self.count
+
+class ResultsDB:
+    """history of test results, by build attempt"""
+    def __init__(self, path=RESULTS_DB):
+        if path != ":memory:" and not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        self._db = sqlite3.connect(path)
+        self._db.execute("pragma foreign_keys = on")
+        version = self._db.execute("pragma user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            with self._db:
+                for table in ["failures", "runs", "builds"]:
+                    self._db.execute("drop table if exists " + table)
+                self._db.execute("pragma user_version = %d" % SCHEMA_VERSION)
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def ingester(self, result_path, revision=""):
+        """returns an Ingest for the results of result_path.  Its
+        add_testcase method can be passed as the observer of a
+        TestLister, so results are indexed without parsing them again."""
+        return Ingest(self._db, result_path, revision)
+
+    def ingest(self, result_path, test_dir, revision=""):
+        """adds all results in test_dir.  Each ingest of a result_path is
+        kept as a separate attempt, as reruns of a revision measure the
+        flakiness of its tests.  Returns the number of results."""
+        ingest = self.ingester(result_path, revision)
+        for a_file in sorted(os.listdir(test_dir)):
+            if not is_test_file(a_file):
+                continue
+            path = os.path.join(test_dir, a_file)
+            # ancestors of the current element
+            stack = []
+            for (event, tag) in et.iterparse(path, events=("start", "end")):
+                if event == "start":
+                    stack.append(tag)
+                    continue
+                stack.pop()
+                if tag.tag != "testcase":
+                    continue
+                ingest.add_testcase(path, tag)
+                tag.clear()
+                # otherwise the suite keeps every cleared testcase
+                if stack:
+                    stack[-1].remove(tag)
+        return ingest.commit()
+
+    def test_history(self, test, hardware=None, arch=None, limit=10):
+        """list of (result_path, revision, hardware, arch, status) for
+        the most recent builds which ran the test's project on the
+        platform, newest first.  The test passed in builds where it did
+        not fail.  Tests which have not failed within the retained
+        builds have no history."""
+        query = ("select b.result_path, b.revision, r.hardware, r.arch, "
+                 "coalesce(f.status, 'pass') "
+                 "from runs r join builds b on r.build = b.id "
+                 "left join failures f on f.build = r.build "
+                 "and f.test = ? and f.hardware = r.hardware "
+                 "and f.arch = r.arch "
+                 "where r.project in "
+                 "(select distinct project from failures where test = ?)")
+        params = [test, test]
+        if hardware:
+            query += " and r.hardware = ?"
+            params.append(hardware)
+        if arch:
+            query += " and r.arch = ?"
+            params.append(arch)
+        query += " order by b.time desc, b.id desc limit ?"
+        params.append(limit)
+        return self._db.execute(query, params).fetchall()
+
+    def first_failing_revision(self, test, hardware, arch, limit=100):
+        """revision of the earliest build in the current run of failures
+        for the test, or None if the test currently passes"""
+        first = None
+        for (_, revision, _, _, status) in self.test_history(test, hardware,
+                                                             arch, limit):
+            if status in ["pass", "skip"]:
+                break
+            first = revision
+        return first
+
+    def repeated_results(self):
+        """list of (test, hardware, arch, revision, passes, failures) for
+        each test which failed in a revision that was run more than
+        once on the platform.  A test which was retried within a build
+        counts as run more than once."""
+        runs = {}
+        for (project, hardware, arch, revision, count) in self._db.execute(
+                "select r.project, r.hardware, r.arch, b.revision, count(*) "
+                "from runs r join builds b on r.build = b.id "
+                "group by r.project, r.hardware, r.arch, b.revision"):
+            runs[(project, hardware, arch, revision)] = count
+        repeated = []
+        for (test, project, hardware, arch, revision, fails,
+             retried) in self._db.execute(
+                 "select f.test, f.project, f.hardware, f.arch, b.revision, "
+                 "sum(coalesce(f.first_status, f.status) in ('fail', 'crash')), "
+                 "sum(f.first_status in ('fail', 'crash') and f.status = 'pass') "
+                 "from failures f join builds b on f.build = b.id "
+                 "group by f.test, f.project, f.hardware, f.arch, b.revision"):
+            if not fails:
+                continue
+            # retries which passed are additional runs of the revision
+            count = runs.get((project, hardware, arch, revision), 0) + retried
+            if count > 1:
+                repeated.append((test, hardware, arch, revision,
+                                 count - fails, fails))
+        return repeated
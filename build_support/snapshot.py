@@ -0,0 +1,98 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+"""copies trees without duplicating file data, by hardlinking files
+when the destination is on the same filesystem and by reflinking
+(where supported) when it is not"""
+import errno
+import os
+import shutil
+from . import run_batch_command
+
+def _same_file(src_stat, dest):
+    """true if dest is already a copy of the file described by src_stat"""
+    try:
+        dest_stat = os.lstat(dest)
+    except OSError:
+        return False
+    if (dest_stat.st_dev, dest_stat.st_ino) == (src_stat.st_dev, src_stat.st_ino):
+        return True
+    return (dest_stat.st_size == src_stat.st_size and
+            int(dest_stat.st_mtime) == int(src_stat.st_mtime))
+
+def _link_file(src, dest):
+    src_stat = os.lstat(src)
+    if _same_file(src_stat, dest):
+        return
+    if os.path.lexists(dest):
+        os.unlink(dest)
+    if os.path.islink(src):
+        os.symlink(os.readlink(src), dest)
+        return
+    try:
+        os.link(src, dest)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK,
+                           errno.ENOTSUP):
+            raise
+        shutil.copy2(src, dest)
+
+def _link_tree(src, dest):
+    if not os.path.isdir(src):
+        _link_file(src, dest)
+        return
+    dirs = []
+    for (dirpath, dirnames, filenames) in os.walk(src):
+        dest_dir = os.path.join(dest, os.path.relpath(dirpath, src))
+        if not os.path.exists(dest_dir):
+            os.makedirs(dest_dir)
+        dirs.append((dirpath, dest_dir))
+        for a_dir in list(dirnames):
+            # os.walk does not follow links to directories
+            if os.path.islink(os.path.join(dirpath, a_dir)):
+                filenames.append(a_dir)
+        for a_file in filenames:
+            _link_file(os.path.join(dirpath, a_file),
+                       os.path.join(dest_dir, a_file))
+    # directory times are changed by creating the contents
+    for (src_dir, dest_dir) in dirs:
+        shutil.copystat(src_dir, dest_dir)
+
+def snapshot(src, dest):
+    """equivalent to "cp -a src dest".  Files which are already present
+    in dest are not copied again.
+
+    The snapshot shares data with src, so files in src must be replaced
+    rather than modified in place if the snapshot is to be preserved."""
+    src = os.path.normpath(src)
+    if os.path.isdir(dest):
+        dest = os.path.join(dest, os.path.basename(src))
+    if os.stat(src).st_dev != os.stat(os.path.dirname(os.path.abspath(dest))).st_dev:
+        run_batch_command(["cp", "-a", "-u", "-T", "--reflink=auto",
+                           src, dest], quiet=True)
+        return
+    _link_tree(src, dest)
@@ -0,0 +1,123 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+import ctypes
+import ctypes.util
+import os
+import select
+import time
+
+# inotify events signalling that a file in the directory was written.
+# Modification events are ignored, because the write may be partial.
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+
+# files are also checked with stat at this interval, because inotify
+# does not report writes made by other hosts to an nfs mount
+STAT_INTERVAL = 1
+
+class _Inotify:
+    """wakes a waiting thread when files change in watched directories"""
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"),
+                                 use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}
+
+    def add(self, directory):
+        if directory in self._dirs:
+            return
+        wd = self._libc.inotify_add_watch(self._fd, directory,
+                                          IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd >= 0:
+            self._dirs[directory] = wd
+
+    def wait(self, timeout):
+        (ready, _, _) = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return
+        # the events are not needed: watched files are compared by
+        # stat to find the ones that changed.
+        try:
+            while os.read(self._fd, 65536):
+                pass
+        except OSError:
+            pass
+
+class StatusWatcher:
+    """Reports writes to build status files, such as the _build_info.txt
+    of each triggered build.  Local writes are seen immediately through
+    inotify, and writes on nfs mounts within STAT_INTERVAL."""
+    def __init__(self):
+        # path -> (mtime, size) when the file was last reported
+        self._stats = {}
+        try:
+            self._inotify = _Inotify()
+        except (OSError, AttributeError):
+            self._inotify = None
+
+    def _stat(self, path):
+        try:
+            s = os.stat(path)
+        except OSError:
+            return None
+        return (s.st_mtime, s.st_size)
+
+    def watch(self, path):
+        self._stats[path] = self._stat(path)
+        if self._inotify and os.path.exists(os.path.dirname(path)):
+            self._inotify.add(os.path.dirname(path))
+
+    def unwatch(self, path):
+        self._stats.pop(path, None)
+
+    def changed(self):
+        """watched files that were written since they were last
+        reported"""
+        changed = []
+        for (path, stat) in self._stats.items():
+            new_stat = self._stat(path)
+            if new_stat != stat:
+                self._stats[path] = new_stat
+                changed.append(path)
+        return changed
+
+    def wait(self, timeout):
+        """blocks until a watched file is written, or for timeout
+        seconds.  Returns the files that changed."""
+        end = time.time() + timeout
+        while True:
+            changed = self.changed()
+            remaining = end - time.time()
+            if changed or remaining <= 0:
+                return changed
+            if self._inotify:
+                self._inotify.wait(min(remaining, STAT_INTERVAL))
+            else:
+                time.sleep(min(remaining, STAT_INTERVAL))
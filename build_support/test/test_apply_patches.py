@@ -0,0 +1,73 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+import os, shutil, subprocess, sys, tempfile
+
+sys.path.append("..")
+
+import build_support as bs
+
+def _git(repo, *args):
+    subprocess.check_call(["git", "-c", "user.name=test",
+                           "-c", "user.email=test@example.com"] + list(args),
+                          cwd=repo, stdout=open(os.devnull, "w"))
+
+def test_prerequisite_order():
+    root = tempfile.mkdtemp()
+    repo = root + "/repo"
+    os.makedirs(repo)
+    _git(repo, "init", "-q")
+    _git(repo, "config", "user.name", "test")
+    _git(repo, "config", "user.email", "test@example.com")
+    for name in ["a", "b"]:
+        open(repo + "/" + name, "w").write(name + "\n")
+    _git(repo, "add", "a", "b")
+    _git(repo, "commit", "-q", "-m", "base")
+    open(repo + "/a", "w").write("a2\n")
+    _git(repo, "commit", "-q", "-a", "-m", "first")
+    open(repo + "/b", "w").write("b2\n")
+    _git(repo, "commit", "-q", "-a", "-m", "second")
+    # the names of the patches sort in the wrong order
+    _git(repo, "format-patch", "-q", "-1", "HEAD~1", "-o", root + "/p1")
+    _git(repo, "format-patch", "-q", "-1", "HEAD", "--base=HEAD~2",
+         "-o", root + "/p2")
+    first = root + "/2-first.patch"
+    second = root + "/1-second.patch"
+    os.rename(root + "/p1/0001-first.patch", first)
+    os.rename(root + "/p2/0001-second.patch", second)
+    _git(repo, "reset", "-q", "--hard", "HEAD~2")
+
+    assert bs.apply_patches(repo, [second, first]) == []
+    assert open(repo + "/b").read() == "b2\n"
+
+    # second is skipped when its prerequisite does not apply
+    _git(repo, "reset", "-q", "--hard", "HEAD~2")
+    open(repo + "/a", "w").write("conflict\n")
+    _git(repo, "commit", "-q", "-a", "-m", "conflict")
+    assert bs.apply_patches(repo, [second, first]) == [first, second]
+    assert open(repo + "/b").read() == "b\n"
+    shutil.rmtree(root)
@@ -0,0 +1,72 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+import os, shutil, sys, tempfile
+
+sys.path.append("..")
+
+import build_support as bs
+
+def test_materialize_from_cache():
+    root = tempfile.mkdtemp()
+    os.makedirs(root + "/tree/lib/empty")
+    open(root + "/tree/lib/libGL.so.1", "w").write("gl")
+    open(root + "/tree/copy.so", "w").write("gl")
+    os.chmod(root + "/tree/copy.so", 0o755)
+    os.symlink("libGL.so.1", root + "/tree/lib/libGL.so")
+
+    store = bs.ArtifactStore(root + "/store", cache_dir=root + "/cache")
+    manifest = store.manifest(root + "/tree")
+    blobs = set(manifest["files"].values())
+    # identical content with a different mode is a different blob
+    assert len(blobs) == 2
+    assert all([store.cached(b) for b in blobs])
+
+    # all blobs are cached, so the store is not accessed
+    store.materialize(manifest, root + "/out")
+    assert open(root + "/out/lib/libGL.so").read() == "gl"
+    assert os.path.isdir(root + "/out/lib/empty")
+    assert os.stat(root + "/out/copy.so").st_mode & 0o777 == 0o755
+    # installed files are copies, so modifying them leaves the cache intact
+    assert os.stat(root + "/out/copy.so").st_nlink == 1
+    open(root + "/out/copy.so", "w").write("modified")
+    store.materialize(manifest, root + "/out")
+    assert open(root + "/out/copy.so").read() == "gl"
+    shutil.rmtree(root)
+
+def test_merge_component_manifests():
+    mesa = {"time": 1, "dirs": ["lib"], "links": {"lib/libGL.so": "libGL.so.1"},
+            "files": {"lib/libGL.so.1": "a-644", "bin/glxinfo": "b-755"}}
+    piglit = {"time": 2, "dirs": ["bin"], "links": {},
+              "files": {"bin/piglit": "c-755", "bin/glxinfo": "d-755"}}
+    merged = bs.merge_manifests([piglit, mesa])
+    assert merged["dirs"] == ["bin", "lib"]
+    assert merged["links"] == {"lib/libGL.so": "libGL.so.1"}
+    # the most recent upload wins
+    assert merged["files"] == {"lib/libGL.so.1": "a-644",
+                               "bin/piglit": "c-755",
+                               "bin/glxinfo": "d-755"}
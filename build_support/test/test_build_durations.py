@@ -0,0 +1,66 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+import sys
+
+sys.path.append("..")
+
+import build_support as bs
+
+def _invoke(project, hardware="skl"):
+    o = bs.Options(["ignore_arg0", "--hardware", hardware])
+    revisions = bs.RevisionSpecification(revisions={"mesa" : "abc"})
+    return bs.ProjectInvoke(o, revision_spec=revisions, project=project)
+
+def test_record():
+    durations = bs.BuildDurations(":memory:")
+    mesa = _invoke("mesa")
+    durations.record(mesa, 100)
+    durations.record(mesa, 200)
+    assert durations.estimates() == {bs.BuildDurations.key(mesa) : 130}
+
+class _Graph(bs.DependencyGraph):
+    def __init__(self, graph):
+        self._dependency_graph = dict((str(k), [str(p) for p in prereqs])
+                                      for (k, prereqs) in graph.items())
+        self._completion_graph = {}
+        self._critical_path = {}
+
+def test_critical_path_first():
+    # mesa and the slow cts build are both ready.  The cts build is
+    # longer, but the piglit tests which wait on mesa take longest.
+    mesa, cts, piglit = _invoke("mesa"), _invoke("cts"), _invoke("piglit-test")
+    graph = _Graph({mesa : [], cts : [], piglit : [mesa]})
+    durations = bs.BuildDurations(":memory:")
+    durations.record(mesa, 100)
+    durations.record(cts, 600)
+    durations.record(piglit, 1000)
+    graph.prioritize(durations)
+    assert [b.project for b in graph.ready_builds()] == ["mesa", "cts"]
+
+    graph.build_complete(mesa)
+    assert [b.project for b in graph.ready_builds()] == ["piglit-test", "cts"]
@@ -0,0 +1,79 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+import json, os, shutil, sys, tempfile
+
+sys.path.append("..")
+
+import build_support as bs
+
+class _Build:
+    def __init__(self, name):
+        self.name = name
+    def __str__(self):
+        return self.name
+    def to_short_string(self):
+        return self.name
+
+def test_trace():
+    mesa, piglit = _Build("mesa"), _Build("piglit-test")
+    infos = {"mesa" : {"trigger_time" : 100.0, "start_time" : 101.0,
+                       "end_time" : 110.0, "collect_time" : 111.0,
+                       "host" : "builder", "status" : "success"},
+             "piglit-test" : {"trigger_time" : 111.0, "start_time" : 115.0,
+                              "end_time" : 130.0, "collect_time" : 131.0,
+                              "host" : "skl-01", "status" : "unstable"}}
+    tmpdir = tempfile.mkdtemp()
+    try:
+        bs.write_trace(tmpdir + "/trace.json", [mesa, piglit], infos,
+                       {"piglit-test" : ["mesa"], "mesa" : []})
+        events = json.load(open(tmpdir + "/trace.json"))["traceEvents"]
+    finally:
+        shutil.rmtree(tmpdir)
+
+    processes = dict((e["args"]["name"], e["pid"]) for e in events
+                     if e["name"] == "process_name")
+    assert sorted(processes.keys()) == ["builder", "queue", "skl-01"]
+    threads = dict(((e["pid"], e["args"]["name"]), e["tid"]) for e in events
+                   if e["name"] == "thread_name")
+    mesa_tid = threads[(processes["builder"], "mesa")]
+    piglit_tid = threads[(processes["skl-01"], "piglit-test")]
+    # each build is on its own track within the queue and its builder
+    assert mesa_tid != piglit_tid
+    assert threads[(processes["queue"], "piglit-test")] == piglit_tid
+    spans = [(e["name"], e["cat"], e["pid"], e["tid"], e["ts"], e["dur"])
+             for e in events if e["ph"] == "X"]
+    assert ("piglit-test", "waiting", processes["queue"], piglit_tid,
+            11000000, 4000000) in spans
+    assert ("piglit-test", "building", processes["skl-01"], piglit_tid,
+            15000000, 15000000) in spans
+    assert ("mesa", "collecting", processes["builder"], mesa_tid,
+            10000000, 1000000) in spans
+    flows = [(e["ph"], e["pid"], e["tid"], e["ts"]) for e in events
+             if e.get("cat") == "dependency"]
+    assert flows == [("s", processes["builder"], mesa_tid, 10000000),
+                     ("f", processes["queue"], piglit_tid, 11000000)]
@@ -0,0 +1,81 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+import sys
+
+sys.path.append("..")
+
+import build_support as bs
+
+CCACHE_3_SUMMARY = """cache directory                     /home/jenkins/.ccache/m64
+primary config                      /home/jenkins/.ccache/m64/ccache.conf
+cache hit (direct)                   120
+cache hit (preprocessed)              30
+cache miss                            50
+called for link                       12
+files in cache                      4000
+cache size                         512.0 MB
+max cache size                      20.0 GB
+"""
+
+# ccache 4.x --print-stats
+CCACHE_4_STATS = """autoconf_test\t3
+cache_miss\t50
+direct_cache_hit\t120
+direct_cache_miss\t80
+local_storage_hit\t150
+local_storage_miss\t50
+preprocessed_cache_hit\t30
+preprocessed_cache_miss\t50
+stats_updated_timestamp\t1539900000
+"""
+
+CCACHE_4_STATS_LOG = """# /src/mesa/src/util/hash_table.c
+direct_cache_hit
+# /src/mesa/src/util/ralloc.c
+cache_miss
+# /src/mesa/src/util/u_math.c
+preprocessed_cache_hit
+"""
+
+def test_ccache_3_summary():
+    counters = bs.parse_ccache_stats(CCACHE_3_SUMMARY)
+    assert(counters == {"direct_cache_hit": 120,
+                        "preprocessed_cache_hit": 30,
+                        "cache_miss": 50})
+
+def test_ccache_4_print_stats():
+    counters = bs.parse_ccache_stats(CCACHE_4_STATS)
+    assert(counters["direct_cache_hit"] == 120)
+    assert(counters["preprocessed_cache_hit"] == 30)
+    assert(counters["cache_miss"] == 50)
+
+def test_ccache_4_stats_log():
+    counters = bs.parse_ccache_stats_log(CCACHE_4_STATS_LOG)
+    assert(counters == {"direct_cache_hit": 1,
+                        "preprocessed_cache_hit": 1,
+                        "cache_miss": 1})
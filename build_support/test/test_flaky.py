@@ -0,0 +1,68 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+import os, shutil, sys, tempfile
+
+sys.path.append("..")
+
+import build_support as bs
+from test_results_db import _results
+
+def test_flaky_scores():
+    root = tempfile.mkdtemp()
+    db = bs.ResultsDB(":memory:")
+    # the same build is tested three times, and bar fails once
+    for status in ["pass", "fail", "pass"]:
+        _results(root + "/a/test", status)
+        db.ingest(root + "/a", root + "/a/test", "mesa=1")
+    # a consistent failure at a new revision is not flaky
+    _results(root + "/d/test", "fail")
+    db.ingest(root + "/d", root + "/d/test", "mesa=2")
+
+    flaky = bs.FlakyTests.from_db(db)
+    assert flaky.score("piglit.spec.foo.bar", "skl", "m64") == 0.5
+    assert flaky.is_flaky("piglit.spec.foo.bar", "sklgt2", "m64")
+    assert not flaky.is_flaky("piglit.spec.foo.bar", "skl", "m32")
+    assert not flaky.is_flaky("piglit.spec.foo.baz", "skl", "m64")
+
+    flaky.write(root + "/flaky.json")
+    loaded = bs.FlakyTests.load(root + "/flaky.json")
+    assert loaded.score("piglit.spec.foo.bar", "skl", "m64") == 0.5
+    db.close()
+    shutil.rmtree(root)
+
+def test_flaky_retry():
+    root = tempfile.mkdtemp()
+    db = bs.ResultsDB(":memory:")
+    # bar failed, and passed when retried within the build
+    _results(root + "/a/test", "pass", first_status="fail")
+    db.ingest(root + "/a", root + "/a/test", "mesa=1")
+    assert db.test_history("piglit.spec.foo.bar")[0][4] == "pass"
+    flaky = bs.FlakyTests.from_db(db)
+    assert flaky.score("piglit.spec.foo.bar", "skl", "m64") == 0.5
+    db.close()
+    shutil.rmtree(root)
@@ -0,0 +1,84 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+import os, shutil, sys, tempfile, time
+
+sys.path.append("..")
+
+import build_support as bs
+
+def _fill(size):
+    def fill(path):
+        open(path + "/data", "w").write("x" * size)
+    return fill
+
+def test_lru_eviction():
+    root = tempfile.mkdtemp()
+    cache = bs.ImportCache(cache_dir=root, budget=250, reserve=0)
+    first = cache.key("/mnt/jenkins/results/a", "listing")
+    second = cache.key("/mnt/jenkins/results/b", "listing")
+    third = cache.key("/mnt/jenkins/results/c", "listing")
+    assert first != second
+    cache.insert(first, _fill(100))
+    cache.insert(second, _fill(100))
+    # first is now the most recently used
+    os.utime(os.path.join(root, second + ".json"), (0, 0))
+    assert cache.lookup(first)
+    cache.insert(third, _fill(100))
+    assert cache.lookup(second) is None
+    assert open(cache.lookup(first) + "/data").read() == "x" * 100
+    assert cache.lookup(third)
+    shutil.rmtree(root)
+
+def test_insert_existing_entry():
+    root = tempfile.mkdtemp()
+    cache = bs.ImportCache(cache_dir=root, budget=1000, reserve=0)
+    key = cache.key("/mnt/jenkins/results/a", "listing")
+    first = cache.insert(key, _fill(10))
+    # another build published the same tree while this one was filling
+    second = cache.insert(key, _fill(20))
+    assert first == second
+    assert open(second + "/data").read() == "x" * 10
+    assert [e[1] for e in cache.entries()] == [key]
+    assert sorted(os.listdir(root)) == sorted([".lock", key, key + ".json"])
+    shutil.rmtree(root)
+
+def test_copy():
+    root = tempfile.mkdtemp()
+    cache = bs.ImportCache(cache_dir=root + "/cache", budget=1000, reserve=0)
+    key = cache.key("/mnt/jenkins/results/a", "listing")
+    def fill(path):
+        os.makedirs(path + "/m64/lib")
+        open(path + "/m64/lib/libGL.so", "w").write("x" * 10)
+    cache.insert(key, fill)
+    assert cache.copy(key, "m64", root + "/br/m64")
+    # builds modify imported files in place
+    open(root + "/br/m64/lib/libGL.so", "w").write("y")
+    assert open(cache.lookup(key) + "/m64/lib/libGL.so").read() == "x" * 10
+    cache.remove(key)
+    assert not cache.copy(key, "m64", root + "/br/m64")
+    shutil.rmtree(root)
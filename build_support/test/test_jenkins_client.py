@@ -0,0 +1,64 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+import sys
+
+sys.path.append("..")
+
+import build_support as bs
+
+def _build(number, result):
+    return {"number" : number,
+            "url" : "http://server/job/Leeroy/" + str(number) + "/",
+            "result" : result,
+            "duration" : 1000,
+            "actions" : [{"causes" : []},
+                         {"parameters" : [{"name" : "hash",
+                                           "value" : "h" + str(number)}]}]}
+
+def test_tree_filter():
+    server = bs.StandInJenkins({
+        "/job/Leeroy" : {"name" : "Leeroy",
+                         "builds" : [_build(n, None) for n in range(12, 0, -1)]},
+        "/job/Leeroy/12" : _build(12, "SUCCESS")}).start()
+    try:
+        client = bs.JenkinsClient()
+        page = client.get(server.url + "/job/Leeroy/12/", "result,url")
+        assert page == {"result" : "SUCCESS",
+                        "url" : "http://server/job/Leeroy/12/"}
+
+        page = client.get(server.url + "/job/Leeroy",
+                          "builds[number,actions[parameters[name,value]]]{0,2}")
+        assert page.keys() == ["builds"]
+        assert [b["number"] for b in page["builds"]] == [12, 11]
+        assert page["builds"][1]["actions"] == [
+            {}, {"parameters" : [{"name" : "hash", "value" : "h11"}]}]
+
+        assert client.get(server.url + "/job/Leeroy/13/", "result") is None
+        assert len(server.requests) == 3
+    finally:
+        server.stop()
@@ -0,0 +1,95 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+import json, shutil, sys, tempfile, time, urllib2
+
+sys.path.append("..")
+
+import build_support as bs
+
+def _trigger(server, result_path, hash_str):
+    f = urllib2.urlopen(server.url + "/job/Leeroy/buildWithParameters?"
+                        "token=noauth&project=mesa&arch=m64&config=debug&"
+                        "hardware=skl&shard=0&hash=" + hash_str +
+                        "&result_path=" + result_path)
+    f.read()
+    return f.info().getheader("Location")
+
+def _wait(condition, timeout=10):
+    end = time.time() + timeout
+    while not condition():
+        assert time.time() < end
+        time.sleep(0.05)
+
+def test_simulated_builds():
+    tmpdir = tempfile.mkdtemp()
+    server = bs.SimulatedJenkins(duration=0.3, queue_delay=0.1,
+                                 executors=1).start()
+    try:
+        client = bs.JenkinsClient()
+        first = _trigger(server, tmpdir, "h1")
+        second = _trigger(server, tmpdir + "/other", "h2")
+        assert client.get(first, "executable[url]") == {}
+
+        # builds wait for the only executor
+        _wait(lambda: client.get(first, "executable[url]"))
+        assert not client.get(second, "executable[url]")
+        url = client.get(first, "executable[url]")["executable"]["url"]
+        assert client.get(url, "result,building") == {"result" : None,
+                                                      "building" : True}
+
+        _wait(lambda: client.get(url, "result")["result"])
+        assert client.get(url, "result,building") == {"result" : "SUCCESS",
+                                                      "building" : False}
+        info = json.load(open(tmpdir + "/mesa/m64/debug/skl/_build_info_0.txt"))
+        assert info["status"] == "success"
+        assert info["end_time"] > info["start_time"]
+
+        _wait(lambda: client.get(second, "executable[url]"))
+        builds = client.get(server.url + "/job/Leeroy",
+                            "builds[number,actions[parameters[name,value]]]")
+        assert [b["number"] for b in builds["builds"]] == [2, 1]
+        assert server.triggered() == 2
+    finally:
+        server.stop()
+        shutil.rmtree(tmpdir)
+
+def test_simulated_failures():
+    tmpdir = tempfile.mkdtemp()
+    server = bs.SimulatedJenkins(duration=0.1, failure_rate=1.0).start()
+    try:
+        client = bs.JenkinsClient()
+        queue_url = _trigger(server, tmpdir, "h1")
+        _wait(lambda: client.get(queue_url, "executable[url]"))
+        url = client.get(queue_url, "executable[url]")["executable"]["url"]
+        _wait(lambda: client.get(url, "result")["result"])
+        assert client.get(url, "result") == {"result" : "FAILURE"}
+        info = json.load(open(tmpdir + "/mesa/m64/debug/skl/_build_info_0.txt"))
+        assert info["status"] == "failed"
+    finally:
+        server.stop()
+        shutil.rmtree(tmpdir)
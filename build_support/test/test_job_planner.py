@@ -0,0 +1,81 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+import multiprocessing, os, shutil, sys, tempfile
+
+sys.path.append("..")
+
+import build_support as bs
+
+def _cgroup(quota=None, period=100000, mem_limit=None, mem_usage=0):
+    root = tempfile.mkdtemp()
+    os.makedirs(root + "/cpu")
+    os.makedirs(root + "/memory")
+    if quota:
+        open(root + "/cpu/cpu.cfs_quota_us", "w").write(str(quota))
+        open(root + "/cpu/cpu.cfs_period_us", "w").write(str(period))
+    if mem_limit:
+        open(root + "/memory/memory.limit_in_bytes", "w").write(str(mem_limit))
+        open(root + "/memory/memory.usage_in_bytes", "w").write(str(mem_usage))
+    return root
+
+def test_cpu_quota():
+    root = _cgroup(quota=400000)
+    p = bs.JobPlanner(mem_available=64 * 1024, load=0.0, cgroup_root=root)
+    cpus = min(multiprocessing.cpu_count(), 4)
+    assert(p.compile_jobs() == cpus + 1)
+    assert(p.test_jobs() == cpus)
+    shutil.rmtree(root)
+
+def test_memory_limits_links():
+    p = bs.JobPlanner(arch="m32", cpus=32, mem_available=8 * 1024, load=0.0,
+                      cgroup_root="/nonexistent")
+    assert(p.compile_jobs() == 16)
+    assert(p.link_jobs() == 4)
+    assert(p.make_jobs() == 13)
+    m64 = bs.JobPlanner(arch="m64", cpus=32, mem_available=8 * 1024, load=0.0,
+                        cgroup_root="/nonexistent")
+    assert(m64.link_jobs() == 5)
+
+def test_cgroup_memory_limit():
+    root = _cgroup(mem_limit=4 * 1024 * 1024 * 1024,
+                   mem_usage=1024 * 1024 * 1024)
+    meminfo = root + "/meminfo"
+    open(meminfo, "w").write("MemTotal:       67108864 kB\n"
+                             "MemAvailable:   33554432 kB\n")
+    p = bs.JobPlanner(cpus=32, load=0.0, cgroup_root=root, meminfo=meminfo)
+    assert(p.compile_jobs() == 6)
+    shutil.rmtree(root)
+
+def test_load():
+    p = bs.JobPlanner(cpus=8, mem_available=64 * 1024, load=12.0,
+                      cgroup_root="/nonexistent")
+    assert(p.compile_jobs() == 5)
+    assert(p.test_jobs() == 4)
+    idle = bs.JobPlanner(cpus=8, mem_available=None, load=100.0,
+                         cgroup_root="/nonexistent")
+    assert(idle.compile_jobs() == 2)
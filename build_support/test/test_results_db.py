@@ -0,0 +1,88 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+import os, shutil, sys, tempfile
+
+sys.path.append("..")
+
+import build_support as bs
+
+def _results(test_dir, status, first_status=None):
+    if not os.path.exists(test_dir):
+        os.makedirs(test_dir)
+    tag = ""
+    if status != "pass":
+        tag = '<failure type="' + status + '"/>'
+    with open(test_dir + "/piglit-test_skl_m64.xml", "w") as fh:
+        fh.write('<testsuites><testsuite name="piglit">'
+                 '<testcase classname="piglit.spec.foo" name="bar.sklm64" '
+                 'status="' + status + '" time="1.5"' +
+                 (' first_status="' + first_status + '"' if first_status else '') +
+                 '>'
+                 '<system-out>bin/bar</system-out>' + tag + '</testcase>'
+                 '<testcase classname="piglit.spec.foo" name="baz.sklm64" '
+                 'status="pass"><system-out>bin/baz</system-out></testcase>'
+                 '</testsuite></testsuites>')
+
+def test_first_failing_revision():
+    root = tempfile.mkdtemp()
+    db = bs.ResultsDB(":memory:")
+    for (rev, status) in [("mesa=1", "pass"), ("mesa=2", "fail"),
+                          ("mesa=3", "fail")]:
+        _results(root + "/" + rev + "/test", status)
+        assert db.ingest(root + "/" + rev, root + "/" + rev + "/test", rev) == 2
+
+    history = db.test_history("piglit.spec.foo.bar", "skl", "m64")
+    assert [h[4] for h in history] == ["fail", "fail", "pass"]
+    assert db.first_failing_revision("piglit.spec.foo.bar", "skl", "m64") == "mesa=2"
+    assert db.first_failing_revision("piglit.spec.foo.baz", "skl", "m64") is None
+
+    # ingesting a build again adds an attempt
+    _results(root + "/mesa=3/test", "pass")
+    db.ingest(root + "/mesa=3", root + "/mesa=3/test", "mesa=3")
+    assert db.first_failing_revision("piglit.spec.foo.bar", "skl", "m64") is None
+    assert len(db.test_history("piglit.spec.foo.bar")) == 4
+    db.close()
+    shutil.rmtree(root)
+
+def test_retained_builds():
+    root = tempfile.mkdtemp()
+    db = bs.ResultsDB(":memory:")
+    retained = bs.results_db.RETAINED_BUILDS
+    bs.results_db.RETAINED_BUILDS = 2
+    try:
+        for rev in ["mesa=1", "mesa=2", "mesa=3"]:
+            _results(root + "/" + rev + "/test", "fail")
+            db.ingest(root + "/" + rev, root + "/" + rev + "/test", rev)
+    finally:
+        bs.results_db.RETAINED_BUILDS = retained
+    history = db.test_history("piglit.spec.foo.bar", "skl", "m64")
+    assert [h[1] for h in history] == ["mesa=3", "mesa=2"]
+    # tests which never failed are not stored
+    assert db.test_history("piglit.spec.foo.baz") == []
+    db.close()
+    shutil.rmtree(root)
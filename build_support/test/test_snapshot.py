@@ -0,0 +1,54 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+import os, shutil, sys, tempfile
+
+sys.path.append("..")
+
+import build_support as bs
+
+def test_snapshot_links():
+    root = tempfile.mkdtemp()
+    os.makedirs(root + "/test/sub")
+    open(root + "/test/a.xml", "w").write("a")
+    open(root + "/test/sub/b.xml", "w").write("b")
+    os.symlink("a.xml", root + "/test/link.xml")
+    os.makedirs(root + "/out")
+
+    # like cp -a, the tree is created inside an existing directory
+    bs.snapshot(root + "/test", root + "/out")
+    assert open(root + "/out/test/sub/b.xml").read() == "b"
+    assert os.readlink(root + "/out/test/link.xml") == "a.xml"
+    assert (os.stat(root + "/out/test/a.xml").st_ino ==
+            os.stat(root + "/test/a.xml").st_ino)
+
+    # files replaced in the source are updated in the snapshot
+    os.unlink(root + "/test/a.xml")
+    open(root + "/test/a.xml", "w").write("aa")
+    bs.snapshot(root + "/test", root + "/out")
+    assert open(root + "/out/test/a.xml").read() == "aa"
+    shutil.rmtree(root)
@@ -0,0 +1,60 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+import os, shutil, sys, tempfile, threading, time
+
+sys.path.append("..")
+
+import build_support as bs
+
+def test_status_watcher():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        info = tmpdir + "/_build_info.txt"
+        other = tmpdir + "/_build_info_1.txt"
+        open(info, "w").write('{"status": "building"}')
+        watcher = bs.StatusWatcher()
+        watcher.watch(info)
+        watcher.watch(other)
+        assert watcher.changed() == []
+        assert watcher.wait(0.1) == []
+
+        def write():
+            time.sleep(0.2)
+            open(info, "w").write('{"status": "success"}')
+        threading.Thread(target=write).start()
+        assert watcher.wait(10) == [info]
+
+        # files are reported when they are created
+        open(other, "w").write("{}")
+        assert watcher.changed() == [other]
+
+        watcher.unwatch(info)
+        open(info, "w").write('{"status": "failure", "url": ""}')
+        assert watcher.changed() == []
+    finally:
+        shutil.rmtree(tmpdir)
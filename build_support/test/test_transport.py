@@ -0,0 +1,134 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+import socket, sys, threading, time
+
+import pytest
+
+sys.path.append("..")
+
+import build_support as bs
+
+def test_keep_alive():
+    server = bs.StandInJenkins({"/job/Leeroy" : {"builds" : []}}).start()
+    try:
+        transport = bs.Transport()
+        for _ in range(3):
+            f = transport.request(server.url + "/job/Leeroy/api/json")
+            assert f.read() == '{"builds": []}'
+        with pytest.raises(bs.TransportError) as e:
+            transport.request(server.url + "/job/Missing/api/json")
+        assert e.value.status == 404
+        metrics = transport.metrics()
+        assert metrics["requests"] == 4
+        assert metrics["connections"] == 1
+        assert metrics["retries"] == 0
+    finally:
+        server.stop()
+
+def test_circuit_breaker():
+    # a port with nothing listening on it
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    url = "http://127.0.0.1:%d/job/Leeroy" % s.getsockname()[1]
+    s.close()
+
+    transport = bs.Transport(retries=2, backoff=0.01, failure_threshold=2)
+    for _ in range(2):
+        with pytest.raises(bs.TransportError) as e:
+            transport.request(url)
+        assert e.value.status is None
+    with pytest.raises(bs.CircuitOpen):
+        transport.request(url)
+    metrics = transport.metrics()
+    assert metrics["retries"] == 4
+    assert metrics["failures"] == 2
+    assert metrics["rejected"] == 1
+
+def test_no_replay_after_timeout():
+    # a server which accepts requests but never responds
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    s.listen(5)
+    url = "http://127.0.0.1:%d/job/Leeroy/build" % s.getsockname()[1]
+    try:
+        transport = bs.Transport(timeout=0.2, retries=2, backoff=0.01)
+        with pytest.raises(bs.TransportError):
+            transport.request(url, data="json={}")
+        assert transport.metrics()["requests"] == 1
+        assert transport.metrics()["retries"] == 0
+    finally:
+        s.close()
+
+def test_no_replay_after_dropped_connection():
+    # a server which reads each request and then closes the connection
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    s.listen(5)
+    url = ("http://127.0.0.1:%d/job/Leeroy/buildWithParameters?token=noauth"
+           % s.getsockname()[1])
+    received = []
+    def serve():
+        while True:
+            try:
+                (conn, _) = s.accept()
+            except socket.error:
+                return
+            received.append(conn.recv(4096))
+            conn.close()
+    server = threading.Thread(target=serve)
+    server.daemon = True
+    server.start()
+    try:
+        transport = bs.Transport(retries=2, backoff=0.01)
+        with pytest.raises(bs.TransportError):
+            transport.request(url, idempotent=False)
+        assert len(received) == 1
+        assert transport.metrics()["retries"] == 0
+
+        # requests which may be repeated are retried
+        with pytest.raises(bs.TransportError):
+            transport.request(url)
+        assert len(received) == 4
+    finally:
+        s.close()
+
+def test_wait_for_circuit():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    url = "http://127.0.0.1:%d/job/Leeroy" % s.getsockname()[1]
+    s.close()
+
+    transport = bs.Transport(retries=0, failure_threshold=1, reset_time=0.5)
+    with pytest.raises(bs.TransportError):
+        transport.request(url)
+    start = time.time()
+    with pytest.raises(bs.TransportError) as e:
+        transport.request(url, wait=True)
+    assert not isinstance(e.value, bs.CircuitOpen)
+    assert time.time() - start >= 0.4
+    assert transport.metrics()["rejected"] == 0
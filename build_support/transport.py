@@ -0,0 +1,258 @@
+# Copyright (C) Intel Corp.  2018.  All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice (including the
+# next paragraph) shall be included in all copies or substantial
+# portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE COPYRIGHT OWNER(S) AND/OR ITS SUPPLIERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#  **********************************************************************/
+#  * Authors:
+#  *   Mark Janes <mark.a.janes@intel.com>
+#  **********************************************************************/
+
+"""http transport shared by everything that talks to the CI server"""
+import errno
+import httplib
+import json
+import random
+import socket
+import threading
+import time
+import urlparse
+
+class TransportError(Exception):
+    """a request failed.  status is the http status, or None if the
+    server could not be reached."""
+    def __init__(self, url, reason, status=None):
+        Exception.__init__(self)
+        self.url = url
+        self.reason = reason
+        self.status = status
+
+    def __str__(self):
+        return "Error: request failed (" + str(self.reason) + "): " + self.url
+
+class CircuitOpen(TransportError):
+    """the server failed repeatedly, and is not sent requests until
+    the circuit resets"""
+    def __init__(self, url, host):
+        TransportError.__init__(self, url, "circuit open for " + host)
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self._headers = dict(headers)
+        self._body = body
+
+    def read(self):
+        return self._body
+
+    def getheader(self, name):
+        return self._headers.get(name.lower())
+
+def _stale_connection(error, sent, idempotent):
+    """true if error shows that the server closed an idle persistent
+    connection without processing the request"""
+    if not sent:
+        return (isinstance(error, socket.error) and
+                error.errno in (errno.ECONNRESET, errno.EPIPE))
+    # a closed connection is only detected on reading the response,
+    # after the server may have acted on the request
+    return idempotent and isinstance(error, httplib.BadStatusLine)
+
+class Transport:
+    """Sends requests over persistent connections, one per thread and
+    host.  Requests that can't reach the server, or that get a server
+    error, are retried with jittered exponential backoff.  After
+    failure_threshold failed requests in a row, the host's circuit opens
+    and requests fail immediately for reset_time seconds, or wait for
+    the circuit to reset."""
+    def __init__(self, timeout=30, retries=5, backoff=1.0, max_backoff=60,
+                 failure_threshold=3, reset_time=60):
+        self._timeout = timeout
+        self._retries = retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._failure_threshold = failure_threshold
+        self._reset_time = reset_time
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # host -> (consecutive failed requests, time the circuit opened)
+        self._circuits = {}
+        self._metrics = {"requests" : 0,
+                         "connections" : 0,
+                         "retries" : 0,
+                         "failures" : 0,
+                         "rejected" : 0,
+                         "latency_total" : 0.0,
+                         "latency_max" : 0.0}
+
+    def _connection(self, scheme, host, timeout):
+        """(connection, True if the connection was used before)"""
+        if not hasattr(self._local, "connections"):
+            self._local.connections = {}
+        key = (scheme, host)
+        conn = self._local.connections.get(key)
+        if conn:
+            conn.timeout = timeout
+            if conn.sock:
+                conn.sock.settimeout(timeout)
+            return (conn, True)
+        if scheme == "https":
+            conn = httplib.HTTPSConnection(host, timeout=timeout)
+        else:
+            conn = httplib.HTTPConnection(host, timeout=timeout)
+        self._local.connections[key] = conn
+        self._count("connections")
+        return (conn, False)
+
+    def _drop(self, scheme, host):
+        conn = self._local.connections.pop((scheme, host), None)
+        if conn:
+            conn.close()
+
+    def _count(self, metric, value=1):
+        with self._lock:
+            self._metrics[metric] += value
+
+    def _check_circuit(self, url, host, wait):
+        while True:
+            with self._lock:
+                (failures, opened) = self._circuits.get(host, (0, None))
+                if opened is None:
+                    return
+                remaining = self._reset_time - (time.time() - opened)
+                if remaining <= 0:
+                    # let this request test the server.  Others are
+                    # rejected until it completes.
+                    self._circuits[host] = (failures, time.time())
+                    return
+                if not wait:
+                    self._metrics["rejected"] += 1
+                    raise CircuitOpen(url, host)
+            # checked again periodically, as another request may close
+            # the circuit first
+            time.sleep(min(remaining, 1.0))
+
+    def _request_failed(self, host):
+        with self._lock:
+            self._metrics["failures"] += 1
+            (failures, opened) = self._circuits.get(host, (0, None))
+            failures += 1
+            if failures >= self._failure_threshold:
+                if opened is None:
+                    print "WARN: " + host + " is not responding"
+                opened = time.time()
+            self._circuits[host] = (failures, opened)
+
+    def _delay(self, attempt):
+        delay = min(self._max_backoff, self._backoff * 2 ** (attempt - 1))
+        return random.uniform(delay / 2, delay)
+
+    def request(self, url, data=None, retries=None, timeout=None,
+                idempotent=None, wait=False):
+        """sends a GET, or a POST if data is provided.  Returns a Response
+        for successful requests, and raises TransportError otherwise.
+
+        Requests which are not idempotent (by default, POSTs) are not
+        sent again once the server may have acted on them, ie if the
+        connection fails after the request was sent.  With wait, a request to a host whose circuit is open
+        blocks until the circuit resets instead of failing."""
+        if idempotent is None:
+            idempotent = data is None
+        if retries is None:
+            retries = self._retries
+        if timeout is None:
+            timeout = self._timeout
+        parts = urlparse.urlsplit(url)
+        host = parts.netloc
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        method = "GET"
+        headers = {}
+        if data is not None:
+            method = "POST"
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+        attempt = 0
+        while True:
+            self._check_circuit(url, host, wait)
+            (conn, reused) = self._connection(parts.scheme, host, timeout)
+            start = time.time()
+            error = None
+            replay = True
+            sent = False
+            try:
+                conn.request(method, path, data, headers)
+                sent = True
+                r = conn.getresponse()
+                response = Response(r.status, r.getheaders(), r.read())
+                if r.status >= 500:
+                    error = TransportError(url, r.reason, r.status)
+            except (httplib.HTTPException, socket.error) as e:
+                self._drop(parts.scheme, host)
+                if reused and _stale_connection(e, sent, idempotent):
+                    # the server closed the idle connection, and did
+                    # not see the request
+                    continue
+                error = TransportError(url, e)
+                if sent and not idempotent:
+                    # the server may have acted on the request
+                    replay = False
+            latency = time.time() - start
+            with self._lock:
+                self._metrics["requests"] += 1
+                self._metrics["latency_total"] += latency
+                self._metrics["latency_max"] = max(latency,
+                                                   self._metrics["latency_max"])
+
+            if not error:
+                with self._lock:
+                    self._circuits.pop(host, None)
+                if response.status >= 400:
+                    raise TransportError(url, r.reason, response.status)
+                return response
+
+            if attempt >= retries or not replay:
+                self._request_failed(host)
+                raise error
+            attempt += 1
+            self._count("retries")
+            delay = self._delay(attempt)
+            print "WARN: retrying in {0:.1f}s: {1}".format(delay, error)
+            time.sleep(delay)
+
+    def metrics(self):
+        """counts of requests, retries and failures, and the latency of
+        requests in seconds"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics["latency_mean"] = 0.0
+        if metrics["requests"]:
+            metrics["latency_mean"] = (metrics["latency_total"] /
+                                       metrics["requests"])
+        return metrics
+
+    def write_metrics(self, path):
+        with open(path, "w") as outf:
+            json.dump(self.metrics(), outf, indent=4, sort_keys=True)
+
+# shared by all requests in the process, so connections and the state
+# of the server are reused.
+TRANSPORT = Transport()
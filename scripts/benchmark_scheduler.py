@@ -0,0 +1,199 @@
+#!/usr/bin/python
+
+"""Measures the overhead of Jenkins.build_all against a simulated build
+master, for synthetic dependency graphs of increasing size.  For each
+graph, reports the time to complete all builds, the shortest time the
+simulated builds allow, and the number of requests sent to the server.
+
+The synthetic build specification is written to a temporary directory,
+which becomes the source root for the run."""
+
+import argparse, os, random, shutil, subprocess, sys, tempfile, time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])), ".."))
+import build_support as bs
+
+def write_tree(root, count, host, seed):
+    """writes a build specification with count projects.  Each project
+    depends on up to three projects that precede it."""
+    rand = random.Random(seed)
+    projects = ["p%04d" % i for i in range(count)]
+    prereqs = {}
+    spec = ['<build_specification>',
+            '  <build_master host="%s" hostname="localhost"/>' % host,
+            '  <repos/>',
+            '  <projects>']
+    for (i, project) in enumerate(projects):
+        prereqs[project] = []
+        if i:
+            prereqs[project] = sorted(set(rand.choice(projects[:i])
+                                          for _ in range(rand.randint(0, 3))))
+        spec.append('    <project name="%s">' % project)
+        for a_prereq in prereqs[project]:
+            spec.append('      <prerequisite name="%s"/>' % a_prereq)
+        spec.append('    </project>')
+        os.makedirs(os.path.join(root, project))
+        open(os.path.join(root, project, "build.py"), "w").close()
+    spec += ['  </projects>', '</build_specification>']
+    open(os.path.join(root, "build_specification.xml"), "w").write(
+        "\n".join(spec) + "\n")
+
+    # Jenkins passes the revision of the source root to each build
+    devnull = open(os.devnull, "w")
+    for cmd in [["git", "init", "-q"],
+                ["git", "add", "build_specification.xml"],
+                ["git", "-c", "user.name=benchmark",
+                 "-c", "user.email=benchmark@localhost",
+                 "commit", "-q", "-m", "synthetic build specification"]]:
+        subprocess.check_call(cmd, cwd=root, stdout=devnull)
+    return prereqs
+
+def ideal_time(prereqs, durations, queue_delay, executors):
+    """lower bound on the time to complete all builds"""
+    finish = {}
+    def finish_time(project):
+        if project not in finish:
+            finish[project] = queue_delay + durations[project] + max(
+                [finish_time(p) for p in prereqs[project]] + [0])
+        return finish[project]
+    critical_path = max([finish_time(p) for p in prereqs])
+    if not executors:
+        return critical_path
+    return max(critical_path, sum(durations.values()) / executors)
+
+def request_kind(path):
+    if "buildWithParameters" in path:
+        return "trigger"
+    if path.startswith("/queue/"):
+        return "queue"
+    if path.split("?")[0].rstrip("/").endswith("/api/json"):
+        parts = path.split("?")[0].split("/")
+        if len(parts) > 4 and parts[3].isdigit():
+            return "build"
+        return "job"
+    return "other"
+
+def run(count, args):
+    root = tempfile.mkdtemp(prefix="benchmark_scheduler.")
+    rand = random.Random(args.seed)
+    durations = {}
+    def duration(params):
+        return durations[params["project"]]
+    server = bs.SimulatedJenkins(duration=duration,
+                                 failure_rate=args.failure_rate,
+                                 queue_delay=args.queue_delay,
+                                 executors=args.executors,
+                                 seed=args.seed).start()
+    saved_argv0 = sys.argv[0]
+    saved_stdout = sys.stdout
+    try:
+        prereqs = write_tree(root, count, server.host, args.seed)
+        for project in sorted(prereqs):
+            durations[project] = rand.uniform(args.min_duration,
+                                              args.max_duration)
+
+        # the source root is found relative to the running script
+        sys.argv[0] = os.path.join(root, "benchmark")
+        result_path = os.path.join(root, "results")
+        o = bs.Options(["benchmark", "--result_path", result_path,
+                        "--hardware", "builder"])
+        graph = bs.DependencyGraph(sorted(prereqs), o)
+        jen = bs.Jenkins(bs.RevisionSpecification(revisions={}), result_path)
+
+        if not args.verbose:
+            sys.stdout = open(os.devnull, "w")
+        failed = 0
+        start = time.time()
+        try:
+            jen.build_all(graph, print_summary=False)
+        except bs.BuildFailure:
+            failed = 1
+        wall = time.time() - start
+    finally:
+        sys.stdout = saved_stdout
+        sys.argv[0] = saved_argv0
+        server.stop()
+        shutil.rmtree(root)
+
+    ideal = ideal_time(prereqs, durations, args.queue_delay, args.executors)
+    kinds = {}
+    for path in server.requests:
+        kind = request_kind(path)
+        kinds[kind] = kinds.get(kind, 0) + 1
+    return {"invokes" : count,
+            "triggered" : server.triggered(),
+            "failed" : failed,
+            "wall" : wall,
+            "ideal" : ideal,
+            "requests" : len(server.requests),
+            "kinds" : kinds}
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the overhead "
+                                     "of build_all against a simulated "
+                                     "build master.")
+    parser.add_argument("--sizes", type=str, default="10,100,500,2000",
+                        help="comma separated numbers of invokes in the "
+                        "synthetic graphs. (default: %(default)s)")
+    parser.add_argument("--min_duration", type=float, default=0.5,
+                        help="shortest simulated build, in seconds. "
+                        "(default: %(default)s)")
+    parser.add_argument("--max_duration", type=float, default=2.0,
+                        help="longest simulated build, in seconds. "
+                        "(default: %(default)s)")
+    parser.add_argument("--queue_delay", type=float, default=0.1,
+                        help="seconds each build waits in the queue. "
+                        "(default: %(default)s)")
+    parser.add_argument("--executors", type=int, default=0,
+                        help="number of simulated builders, 0 for no "
+                        "limit. (default: %(default)s)")
+    parser.add_argument("--failure_rate", type=float, default=0.0,
+                        help="fraction of builds that fail. "
+                        "(default: %(default)s)")
+    parser.add_argument("--poll_interval", type=float,
+                        default=bs.jenkins.POLL_INTERVAL,
+                        help="seconds between polls of the server. "
+                        "(default: %(default)s)")
+    parser.add_argument("--settle_time", type=float,
+                        default=bs.jenkins.SETTLE_TIME,
+                        help="seconds the server takes to report the "
+                        "final status of a build. (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed for the synthetic graphs and "
+                        "failures. (default: %(default)s)")
+    parser.add_argument("--verbose", action="store_true",
+                        help="show the output of build_all")
+    args = parser.parse_args()
+
+    bs.jenkins.POLL_INTERVAL = args.poll_interval
+    bs.jenkins.SETTLE_TIME = args.settle_time
+
+    # keep the durations of synthetic builds out of the history used
+    # to schedule real builds
+    history_dir = tempfile.mkdtemp(prefix="benchmark_scheduler.")
+    bs.build_durations.DURATIONS_DB = os.path.join(history_dir,
+                                                   "durations.db")
+
+    row = "{0:>8} {1:>9} {2:>8} {3:>8} {4:>9} {5:>9}  {6}"
+    print row.format("invokes", "wall (s)", "ideal", "overhead",
+                     "requests", "per build", "requests by kind")
+    try:
+        for count in [int(s) for s in args.sizes.split(",")]:
+            r = run(count, args)
+            kinds = " ".join(["%s=%d" % (k, v)
+                              for (k, v) in sorted(r["kinds"].items())])
+            if r["failed"]:
+                kinds += " (failures)"
+            print row.format(r["invokes"],
+                             "%.1f" % r["wall"],
+                             "%.1f" % r["ideal"],
+                             "%.1f" % (r["wall"] - r["ideal"]),
+                             r["requests"],
+                             "%.1f" % (float(r["requests"]) /
+                                       max(r["triggered"], 1)),
+                             kinds)
+            sys.stdout.flush()
+    finally:
+        shutil.rmtree(history_dir)
+
+if __name__ == "__main__":
+    main()
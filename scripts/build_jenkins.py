@@ -1,31 +1,144 @@
 import argparse
 import datetime
+import multiprocessing
 import os
+import StringIO
+import subprocess
 import sys
 import tarfile
 import time
 from prettytable import PrettyTable
 import xml.etree.cElementTree as et
+from xml.sax.saxutils import quoteattr
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])), ".."))
 import build_support as bs
 
+def strip_test(a_test):
+    # strip suffix
+    a_test.attrib["name"] = ".".join(a_test.attrib["name"].split(".")[:-1])
+    fails = a_test.findall("failure") + a_test.findall("error")
+    if not fails:
+        # strip status if no fail tag
+        a_test.attrib["status"] = "pass"
+        # strip output for passes.  crucible junit does not
+        # presently have system out/err
+        sout = a_test.find("system-out")
+        if sout is not None:
+            sout.text = " "
+        serr = a_test.find("system-err")
+        if serr is not None:
+            serr.text = " "
+
 def strip_passes(root):
     for a_suite in root.findall("testsuite"):
         for a_test in a_suite.findall("testcase"):
-            # strip suffix
-            a_test.attrib["name"] = ".".join(a_test.attrib["name"].split(".")[:-1])
-            fails = a_test.findall("failure") + a_test.findall("error")
-            if not fails:
-                # strip status if no fail tag
-                a_test.attrib["status"] = "pass"
-                # strip output for passes.  crucible junit does not
-                # presently have system out/err
-                sout = a_test.find("system-out")
-                if sout is not None:
-                    sout.text = " "
-                serr = a_test.find("system-err")
-                if serr is not None:
-                    serr.text = " "
+            strip_test(a_test)
+
+def merge_shards(shards, out_fh):
+    """writes the stripped testcases of each shard to out_fh, as a
+    single testsuite.  Shards are parsed incrementally, so memory use
+    does not depend on the size or number of shards."""
+    out_fh.write("<testsuites>")
+    suite_started = False
+    for shard in shards:
+        context = et.iterparse(shard, events=("start", "end"))
+        # ancestors of the current element
+        stack = []
+        for (event, elem) in context:
+            if event == "start":
+                stack.append(elem)
+                if elem.tag == "testsuite" and not suite_started:
+                    # attributes of the first suite are kept
+                    attrib = dict(elem.attrib)
+                    attrib.pop("tests", None)
+                    out_fh.write("<testsuite" + "".join(
+                        [" " + k + "=" + quoteattr(v) for (k, v) in sorted(attrib.items())]) + ">")
+                    suite_started = True
+                continue
+            stack.pop()
+            if elem.tag == "testcase":
+                strip_test(elem)
+                elem.tail = None
+                out_fh.write(et.tostring(elem))
+                elem.clear()
+                # otherwise the suite keeps every cleared testcase
+                if stack:
+                    stack[-1].remove(elem)
+            elif elem.tag == "testsuite":
+                elem.clear()
+    if not suite_started:
+        out_fh.write("<testsuite>")
+    out_fh.write("</testsuite></testsuites>")
+
+def _stripped_xml(job):
+    """strips passes from a junit file, or merges a set of shards.  Runs
+    in a worker process.  Returns the stripped document."""
+    (files, merge) = job
+    if merge:
+        # passes are stripped as the shards are parsed, so the merged
+        # document is small enough to be held in memory
+        out_fh = StringIO.StringIO()
+        merge_shards(files, out_fh)
+        return out_fh.getvalue()
+    t = et.parse(files[0])
+    r = t.getroot()
+    strip_passes(r)
+    return et.tostring(r)
+
+def write_results_tar(test_dir):
+    """streams stripped results and logs from test_dir through a
+    multithreaded xz, to test_dir/results.tar.xz"""
+    members = []
+    shards = {}
+    for a_file in sorted(os.listdir(test_dir)):
+        if "piglit" not in a_file:
+            continue
+        if ":" in a_file:
+            shard_base_name = "_".join(a_file.split("_")[:-1])
+            if not shards.has_key(shard_base_name):
+                shards[shard_base_name] = []
+            shards[shard_base_name].append(test_dir + "/" + a_file)
+            continue
+        members.append((a_file, ([test_dir + "/" + a_file], False)))
+    for (shard, files) in sorted(shards.items()):
+        members.append((shard + ".xml", (files, True)))
+
+    # started before xz, so the workers don't inherit its input pipe
+    pool = multiprocessing.Pool()
+    out_file = test_dir + "/results.tar.xz"
+    out_fh = open(out_file, "wb")
+    xz = subprocess.Popen(["xz", "-T0", "-9", "-c"],
+                          stdin=subprocess.PIPE, stdout=out_fh)
+    completed = False
+    try:
+        tar = tarfile.open(fileobj=xz.stdin, mode="w|")
+        for ((name, _), data) in zip(members,
+                                     pool.imap(_stripped_xml, [m[1] for m in members])):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = time.time()
+            tar.addfile(info, StringIO.StringIO(data))
+
+        if os.path.exists(test_dir + "/logs"):
+            tar.add(test_dir + "/logs", arcname="logs")
+
+        tar.close()
+        xz.stdin.close()
+        if xz.wait() != 0:
+            raise subprocess.CalledProcessError(xz.returncode, "xz")
+        completed = True
+    finally:
+        pool.close()
+        pool.join()
+        if not completed:
+            # don't leave a partial archive, or a compressor waiting
+            # for input
+            if xz.poll() is None:
+                xz.kill()
+                xz.wait()
+        out_fh.close()
+        if not completed:
+            os.unlink(out_file)
 
 def create_revision_table():
     repo_set = bs.RepoSet()
@@ -85,96 +198,61 @@ def collate_tests(result_path, out_test_dir, make_tar=False):
     if not make_tar:
         return
 
-    # else generate a results.tgz that can be used with piglit summary
-    save_dir = os.getcwd()
-    os.chdir("/tmp/")
-    tar = tarfile.open(out_test_dir + "/test/results.tar", "w:")
-    shards = {}
-    for a_file in os.listdir(out_test_dir + "/test"):
-        if "piglit" not in a_file:
-            continue
-        if ":" in a_file:
-            shard_base_name = "_".join(a_file.split("_")[:-1])
-            if not shards.has_key(shard_base_name):
-                shards[shard_base_name] = []
-            shards[shard_base_name].append(a_file)
-            continue
-        t = et.parse(out_test_dir + "/test/" + a_file)
-        r = t.getroot()
-        strip_passes(r)
-        t.write(a_file)
-        # occasionally, t.write() finishes, but the file is not available
-        t = None
-        for _ in range(0,5):
-            try:
-                tar.add(a_file)
-                break
-            except:
-                print "WARN: failed to add file: " + a_file
-                time.sleep(10)
-        os.unlink(a_file)
-    for (shard, files) in shards.items():
-        t = et.parse(out_test_dir + "/test/" + files[0])
-        r = t.getroot()
-        strip_passes(r)
-        suite = r.find("testsuite")
-        for shards in files[1:]:
-            st = et.parse(out_test_dir + "/test/" + shards)
-            sr = st.getroot()
-            strip_passes(sr)
-            for a_suite in sr.findall("testsuite"):
-                for a_test in a_suite.findall("testcase"):
-                    suite.append(a_test)
-        shard_file = shard + ".xml"
-        t.write(shard_file)
-        # occasionally, t.write() finishes, but the file is not available
-        t = None
-        for _ in range(0,5):
-            try:
-                tar.add(shard_file)
-                break
-            except:
-                print "WARN: failed to add file: " + shard_file
-                time.sleep(10)
-        os.unlink(shard_file)
-
-    if os.path.exists(out_test_dir + "/test/logs"):
-        save_dir = os.getcwd()
-        os.chdir(out_test_dir + "/test")
-        tar.add("logs")
-        os.chdir(save_dir)
-
-    tar.close()
-    bs.run_batch_command(["xz", "-9", out_test_dir + "/test/results.tar"])
-    os.chdir(save_dir)
-
-    tl = bs.TestLister(out_test_dir + "/test")
+    # else generate a results.tar.xz that can be used with piglit summary
+    write_results_tar(out_test_dir + "/test")
+
+    # the results are indexed for queries of test history while they
+    # are parsed for the summary
+    db = None
+    ingest = None
+    try:
+        revision = ""
+        revisions_xml = os.path.join(result_path, "revisions.xml")
+        if os.path.exists(revisions_xml):
+            revspec = bs.RevisionSpecification.from_xml_file(revisions_xml)
+            revision = " ".join(sorted(revspec.to_cmd_line_param().split()))
+        db = bs.ResultsDB()
+        ingest = db.ingester(result_path, revision)
+    except Exception as e:
+        print "WARN: failed to open test results database: " + str(e)
+
+    # failures and totals are gathered in a single pass
+    tl = bs.TestLister(out_test_dir + "/test", count_passes=True,
+                       observer=ingest and ingest.add_testcase)
+    if ingest:
+        try:
+            count = ingest.commit()
+            print "INFO: indexed " + str(count) + " test results"
+            # publish flakiness scores, for retry decisions on the testers
+            results_dir = bs.ProjectMap().build_spec().find("build_master").attrib["results_dir"]
+            bs.FlakyTests.from_db(db).write(bs.FlakyTests.published_path(results_dir))
+        except Exception as e:
+            print "WARN: failed to index test results: " + str(e)
+        db.close()
+
     tests = tl.Tests()
     if tests:
+        counts = tl.TestCounts()
+        all_tests = sum([c[0] for c in counts.values()])
+        failed_tests = len(tests)
+        passed_tests = all_tests - failed_tests
         with open("test_summary.txt", "w") as fh:
             for atest in tests:
                 atest.PrettyPrint(fh)
-            fh.flush()
-            # end users report that sometimes the summary is empty
-            os.fsync(fh.fileno())
-            fh.close()
-        time.sleep(10)
-
-        tc = bs.TestLister(out_test_dir + "/test", include_passes=True)
-        all_tests = len(tc.Tests())
-
-        failed_tests = 0
-        tf = bs.TestLister(out_test_dir + "/test")
-        failed_tests = len(tf.Tests())
-        passed_tests = all_tests - failed_tests
-        percent = (passed_tests*100) / all_tests
-        percentage = format(percent, '.2f')
-        if all_tests:
-            with open("test_summary.txt", "a") as fh:
+            if all_tests:
+                percent = (passed_tests*100) / all_tests
+                percentage = format(percent, '.2f')
                 fh.write("""
 
         Tests passed: {} / {} ({}%)
                 """.format(passed_tests,all_tests,percentage)     )
+                for (project, (total, failed)) in sorted(counts.items()):
+                    fh.write("\n        {}: {} / {}".format(project,
+                                                            total - failed,
+                                                            total))
+            fh.flush()
+            # end users report that sometimes the summary is empty
+            os.fsync(fh.fileno())
 
 def main():
     # reuse the options from the gasket
@@ -4,8 +4,6 @@ import git
 import argparse
 import sys
 import urllib
-import urllib2
-import time
 import os
 
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])), ".."))
@@ -103,15 +101,5 @@ for commit in commits:
                  "branch" : args.branch }
     url = custom_url.format(urllib.urlencode(job_args))
 
-    failcount = 0
-    while True:
-        try:
-            f = urllib2.urlopen(url)
-            break
-        except (urllib2.HTTPError, urllib2.URLError):
-            print "failure urllib2.urlopen(\"{0}\")".format(url)
-            failcount += 1
-            if failcount == 5:
-                raise
-            time.sleep(5)
+    bs.TRANSPORT.request(url, idempotent=False)
 
@@ -5,7 +5,6 @@ import hashlib
 import os
 import sys
 import time
-import urllib2
 
 # When running as a service, mesa_jenkins must be available to
 # automation.  See:
@@ -57,26 +56,15 @@ def main():
             job_url = ("http://" + server + "/job/" + branch +
                        "/buildWithParameters?token=noauth&name=" + commit +
                        "&type=percheckin")
-            retry_count = 0
-
-            # how wonderful, the proxy setting is required for
-            # git but prevents the service from accessing
-            # otc-mesa-ci.
-            os.environ["http_proxy"] = ""
-            while retry_count < 10:
-                try:
-                    f = urllib2.urlopen(job_url)
-                    f.read()
-                    f.close()
-                    break
-                except urllib2.HTTPError as e:
-                    print(e, file=sys.stderr)
-                    retry_count = retry_count + 1
-                    print("ERROR: failed to reach jenkins, retrying: " +
-                          job_url, file=sys.stderr)
-                    sys.stderr.flush()
-                    time.sleep(10)
-            os.environ["http_proxy"] = "http://proxy.jf.intel.com:911/"
+            # the proxy setting is required for git, but the
+            # transport connects to otc-mesa-ci directly.
+            try:
+                bs.TRANSPORT.request(job_url, retries=9, idempotent=False)
+            except bs.TransportError as e:
+                print(e, file=sys.stderr)
+                print("ERROR: failed to reach jenkins: " + job_url,
+                      file=sys.stderr)
+                sys.stderr.flush()
 
         time.sleep(5)
 